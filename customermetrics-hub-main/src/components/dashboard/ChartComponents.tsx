@@ -1,5 +1,7 @@
 import { PieChart, Pie, Cell, BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer, LineChart, Line, Area, AreaChart } from 'recharts';
 import { useEffect, useState } from 'react';
+import { DataService } from '@/services/dataService';
+import { ChurnSegmentsResult } from '@/types';
 
 // Churn Distribution Data
 const churnDistributionData = [
@@ -60,10 +62,38 @@ const CustomTooltip = ({ active, payload, label }: any) => {
   return null;
 };
 
+const RISK_LEVELS = [
+  { segment: 'Low', name: 'Low Risk', color: '#10b981' },
+  { segment: 'Medium', name: 'Medium Risk', color: '#f59e0b' },
+  { segment: 'High', name: 'High Risk', color: '#ef4444' }
+];
+
+// Counts from the backend are estimates with intervals when they come from its sample
+function segmentChartData(result: ChurnSegmentsResult) {
+  const total = Object.values(result.by_segment).reduce((sum, count) => sum + count, 0);
+  return RISK_LEVELS.map(({ segment, name, color }) => {
+    const count = result.by_segment[segment] ?? 0;
+    return {
+      name,
+      value: total > 0 ? Math.round((count / total) * 100) : 0,
+      count,
+      color,
+      interval: result.intervals?.[segment] ?? null
+    };
+  });
+}
+
 export function ChurnDistributionChart() {
   const [churnData, setChurnData] = useState([]);
 
   useEffect(() => {
+    // Uploaded datasets are scored by the backend, honouring the records-to-analyze setting
+    if (DataService.getDatasetId()) {
+      DataService.fetchChurnSegments()
+        .then(result => setChurnData(segmentChartData(result)))
+        .catch(err => console.error('Error fetching churn segments:', err));
+    }
+
     const saved = localStorage.getItem('customers');
     if (saved) {
       const customers = JSON.parse(saved);
@@ -116,6 +146,11 @@ export function ChurnDistributionChart() {
                     <div className="bg-popover border border-border rounded-lg p-3 shadow-lg">
                       <p className="text-sm font-medium text-popover-foreground">{data.name}</p>
                       <p className="text-sm text-muted-foreground">{data.count.toLocaleString()} customers</p>
+                      {data.interval && (
+                        <p className="text-sm text-muted-foreground">
+                          {Math.round(data.interval[0]).toLocaleString()}–{Math.round(data.interval[1]).toLocaleString()} (estimate)
+                        </p>
+                      )}
                       <p className="text-sm text-muted-foreground">{data.value}% of total</p>
                     </div>
                   );
@@ -281,6 +316,85 @@ export function SalesForecastChart() {
   );
 }
 
+export function ChurnTrendChart() {
+  const [trendData, setTrendData] = useState([]);
+  const [hasLabel, setHasLabel] = useState(true);
+
+  useEffect(() => {
+    if (!DataService.getDatasetId()) {
+      setTrendData([{ month: 'No Data', churnRate: 0 }]);
+      return;
+    }
+    DataService.fetchChurnTrends()
+      .then(result => {
+        // rates are null when the upload has no churn label (is_churn, churned, ...)
+        if (result.churn_rate.every(rate => rate === null)) {
+          setHasLabel(false);
+          setTrendData([{ month: 'No Data', churnRate: 0 }]);
+          return;
+        }
+        setHasLabel(true);
+        setTrendData(result.periods.map((month, index) => ({
+          month,
+          churnRate: result.churn_rate[index],
+          interval: result.intervals?.[index] ?? null
+        })));
+      })
+      .catch(err => {
+        console.error('Error fetching churn trends:', err);
+        setTrendData([{ month: 'No Data', churnRate: 0 }]);
+      });
+  }, []);
+
+  return (
+    <div className="chart-container">
+      <h3 className="text-lg font-semibold text-foreground mb-2">Churn Rate Trend</h3>
+      <p className="text-sm text-muted-foreground mb-6">
+        {hasLabel
+          ? 'Monthly churn rate of the uploaded customers'
+          : 'Upload customers with a churn column (e.g. is_churn) to see the trend'}
+      </p>
+
+      <div className="h-64">
+        <ResponsiveContainer width="100%" height="100%">
+          <LineChart data={trendData}>
+            <CartesianGrid strokeDasharray="3 3" stroke="hsl(var(--border))" />
+            <XAxis dataKey="month" />
+            <YAxis tickFormatter={(value) => `${value}%`} />
+            <Tooltip
+              content={({ payload, label }) => {
+                if (payload && payload.length) {
+                  const data = payload[0].payload;
+                  return (
+                    <div className="bg-popover border border-border rounded-lg p-3 shadow-lg">
+                      <p className="text-sm font-medium text-popover-foreground mb-1">{label}</p>
+                      <p className="text-sm text-muted-foreground">Churn rate: {data.churnRate}%</p>
+                      {data.interval && (
+                        <p className="text-sm text-muted-foreground">
+                          {data.interval[0]}–{data.interval[1]}% (estimate)
+                        </p>
+                      )}
+                    </div>
+                  );
+                }
+                return null;
+              }}
+            />
+            <Line
+              type="monotone"
+              dataKey="churnRate"
+              stroke="hsl(var(--destructive))"
+              strokeWidth={3}
+              dot={{ fill: 'hsl(var(--destructive))', strokeWidth: 2, r: 4 }}
+              name="Churn Rate"
+            />
+          </LineChart>
+        </ResponsiveContainer>
+      </div>
+    </div>
+  );
+}
+
 export function NPSTrendChart() {
   return (
     <div className="chart-container">
@@ -5,6 +5,7 @@ import {
   ChurnDistributionChart, 
   FeatureImportanceChart, 
   SalesForecastChart, 
+  ChurnTrendChart,
   NPSTrendChart 
 } from '@/components/dashboard/ChartComponents';
 
@@ -27,6 +28,9 @@ export default function Dashboard() {
             
             {/* Sales Forecast Chart */}
             <SalesForecastChart />
+
+            {/* Churn Rate Trend */}
+            <ChurnTrendChart />
             
             {/* Customer Churn Table */}
             <ChurnTable />
@@ -10,11 +10,20 @@ import {
   CancellationData,
   PriceQuantityData,
   PromotionData,
+  DatasetSummary,
+  DatasetPage,
+  AnalysisMode,
+  ChurnSegmentsResult,
+  ChurnTrendsResult,
 } from "../types";
 
+const API_BASE = "http://localhost:8000";
+
 export class DataService {
   private static churnData: CustomerData[] = [];
   private static salesData: CustomerData[] = [];
+  private static datasetId: string | null = null;
+  private static datasetSummary: DatasetSummary | null = null;
   private static config: VisualizationConfig = {
     showAgeGroups: true,
     showCountryAnalysis: true,
@@ -34,7 +43,7 @@ static async uploadFile(
   formData.append("file", file);
 
   try {
-    const response = await fetch("http://localhost:8000/upload-customers/", {
+    const response = await fetch(`${API_BASE}/upload-customers/`, {
       method: "POST",
       body: formData,
     });
@@ -49,7 +58,15 @@ static async uploadFile(
       throw new Error(result.error);
     }
 
-    const processedData: CustomerData[] = result.data.map((row: any) => ({
+    // The upload returns a dataset handle; only the analyzed slice is pulled into the browser.
+    this.datasetId = result.dataset_id;
+    this.datasetSummary = result.summary;
+    const rows = await this.fetchAllRecords(
+      result.dataset_id,
+      Math.min(this.config.recordsToAnalyze, result.summary.rows)
+    );
+
+    const processedData: CustomerData[] = rows.map((row: any) => ({
       ...row,
       age_group: row.age_group || this.getAgeGroup(row.age),
       months_since_last_purchase:
@@ -88,7 +105,7 @@ static async uploadFile(
       this.salesData = processedData;
     }
 
-    this.config.maxRecords = processedData.length;
+    this.config.maxRecords = result.summary.rows;
     this.config.recordsToAnalyze = Math.min(1000, processedData.length);
 
     return processedData;
@@ -98,6 +115,87 @@ static async uploadFile(
 }
 
 
+  static async fetchRecords(
+    datasetId: string,
+    params: {
+      columns?: string[];
+      filters?: string[];
+      sort?: string;
+      order?: "asc" | "desc";
+      limit?: number;
+      cursor?: string | null;
+    } = {}
+  ): Promise<DatasetPage> {
+    const query = new URLSearchParams();
+    if (params.columns?.length) query.set("columns", params.columns.join(","));
+    params.filters?.forEach((f) => query.append("filter", f));
+    if (params.sort) query.set("sort", params.sort);
+    if (params.order) query.set("order", params.order);
+    if (params.limit) query.set("limit", String(params.limit));
+    if (params.cursor) query.set("cursor", params.cursor);
+
+    const response = await fetch(
+      `${API_BASE}/api/datasets/${datasetId}/records?${query.toString()}`
+    );
+    if (!response.ok) {
+      const errorData = await response.json().catch(() => ({}));
+      throw new Error(errorData.detail || "Failed to fetch records");
+    }
+    return response.json();
+  }
+
+  private static async fetchAllRecords(
+    datasetId: string,
+    maxRows: number
+  ): Promise<any[]> {
+    const rows: any[] = [];
+    let cursor: string | null = null;
+    do {
+      const page = await this.fetchRecords(datasetId, {
+        limit: Math.min(5000, maxRows - rows.length),
+        cursor,
+      });
+      rows.push(...page.data);
+      cursor = page.next_cursor;
+    } while (cursor && rows.length < maxRows);
+    return rows;
+  }
+
+  // Analytics are estimated from the backend's stratified sample when fewer
+  // records are to be analyzed than the dataset holds.
+  private static analysisQuery(mode?: AnalysisMode): URLSearchParams {
+    const { recordsToAnalyze, maxRecords } = this.config;
+    const resolved = mode ?? (recordsToAnalyze < maxRecords ? "approx" : "exact");
+    const query = new URLSearchParams({ mode: resolved });
+    if (resolved === "approx") query.set("sample_size", String(recordsToAnalyze));
+    return query;
+  }
+
+  private static async fetchAnalytics<T>(path: string, query: URLSearchParams): Promise<T> {
+    const response = await fetch(`${API_BASE}${path}?${query.toString()}`);
+    if (!response.ok) {
+      const errorData = await response.json().catch(() => ({}));
+      throw new Error(errorData.detail || `Failed to fetch ${path}`);
+    }
+    return response.json();
+  }
+
+  static fetchChurnSegments(mode?: AnalysisMode): Promise<ChurnSegmentsResult> {
+    return this.fetchAnalytics("/api/churn/segments", this.analysisQuery(mode));
+  }
+
+  static fetchChurnTrends(mode?: AnalysisMode): Promise<ChurnTrendsResult> {
+    return this.fetchAnalytics("/api/churn/trends", this.analysisQuery(mode));
+  }
+
+  static getDatasetId(): string | null {
+    return this.datasetId;
+  }
+
+  static getDatasetSummary(): DatasetSummary | null {
+    return this.datasetSummary;
+  }
+
   private static getAgeGroup(age: number): string {
     if (age < 25) return "Under 25";
     if (age < 35) return "25-34";
@@ -110,3 +110,40 @@ export interface VisualizationConfig {
   recordsToAnalyze: number;
   maxRecords: number;
 }
+
+export interface DatasetSummary {
+  rows: number;
+  columns: string[];
+  numeric: Record<string, { count: number; mean: number | null; min: number | null; max: number | null }>;
+  categorical: Record<string, Record<string, number>>;
+}
+
+export type AnalysisMode = "exact" | "approx";
+
+// Sample behind mode=approx estimates; sample_rows etc. are null for exact results
+export interface ApproxInfo {
+  mode: AnalysisMode;
+  sample_rows: number | null;
+  population_rows: number | null;
+  confidence: number | null;
+}
+
+export interface ChurnSegmentsResult extends ApproxInfo {
+  by_segment: Record<string, number>;
+  intervals: Record<string, [number, number]> | null;
+}
+
+export interface ChurnTrendsResult extends ApproxInfo {
+  periods: string[];
+  churn_rate: (number | null)[];
+  intervals: [number, number][] | null;
+}
+
+export interface DatasetPage {
+  ok: boolean;
+  dataset_id: string;
+  total: number;
+  count: number;
+  next_cursor: string | null;
+  data: any[];
+}
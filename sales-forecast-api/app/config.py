@@ -5,6 +5,34 @@ class Settings(BaseSettings):
     frontend_origin: str = Field(default="http://localhost:5173", alias="FRONTEND_ORIGIN")
     default_data_path: str | None = Field(default=None, alias="DEFAULT_DATA_PATH")
 
+    # compute pools: worker threads and how many extra tasks may wait before 429
+    inference_workers: int = Field(default=4, alias="INFERENCE_WORKERS")
+    inference_queue_limit: int = Field(default=64, alias="INFERENCE_QUEUE_LIMIT")
+    forecasting_workers: int = Field(default=2, alias="FORECASTING_WORKERS")
+    forecasting_queue_limit: int = Field(default=8, alias="FORECASTING_QUEUE_LIMIT")
+    training_workers: int = Field(default=1, alias="TRAINING_WORKERS")
+    training_queue_limit: int = Field(default=2, alias="TRAINING_QUEUE_LIMIT")
+    compute_retry_after: int = Field(default=1, alias="COMPUTE_RETRY_AFTER")
+
+    # micro-batching for /api/churn/predict
+    coalesce_predictions: bool = Field(default=True, alias="COALESCE_PREDICTIONS")
+    coalesce_max_batch_rows: int = Field(default=512, alias="COALESCE_MAX_BATCH_ROWS")
+    coalesce_max_wait_ms: float = Field(default=2.0, alias="COALESCE_MAX_WAIT_MS")
+
+    # processed datasets kept in memory for paginated access
+    max_datasets: int = Field(default=4, alias="MAX_DATASETS")
+
+    # content-addressed uploads and the artifacts derived from them
+    ingest_dir: str = Field(default="app/data/ingest", alias="INGEST_DIR")
+    ingest_max_entries: int = Field(default=32, alias="INGEST_MAX_ENTRIES")
+    ingest_max_bytes: int = Field(default=2 * 1024 ** 3, alias="INGEST_MAX_BYTES")
+
+    # stratified samples built at load time for mode=approx analytics
+    sample_rows: int = Field(default=100_000, alias="SAMPLE_ROWS")
+    sample_min_per_stratum: int = Field(default=30, alias="SAMPLE_MIN_PER_STRATUM")
+    sample_seed: int = Field(default=0, alias="SAMPLE_SEED")
+    sample_confidence: float = Field(default=0.95, alias="SAMPLE_CONFIDENCE")
+
     class Config:
         env_file = ".env"
 
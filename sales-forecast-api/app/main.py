@@ -1,6 +1,7 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
+from fastapi.responses import JSONResponse, Response
+from typing import List, Optional, Tuple
 from pathlib import Path
 import io
 import os
@@ -10,9 +11,18 @@ import joblib
 # --- Import internal modules from your second app ---
 from app.schemas import *
 from app.config import settings
-from app.services.common import STORE, smart_read
+from app.services.common import STORE, smart_read, find_churn_col, to_bool_series
 from app.services import churn as churn_svc
 from app.services import sales as sales_svc
+from app.services.executor import EXECUTOR, PoolSaturated
+from app.services import datasets as datasets_svc
+from app.services.datasets import DATASETS
+from app.services.compaction import compact_frame
+from app.services.forecast_state import FORECAST_STATE
+from app.services.scorer import get_scorer
+from app.services.coalescer import InferenceCoalescer
+from app.services.ingest import INGEST, entry_of
+from app.services import sampling
 
 # --- Import modules from first app ---
 from app.model import preprocess_data, feature_engineering, generate_forecast
@@ -35,6 +45,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- Micro-batching of concurrent churn predictions ---
+PREDICT_COALESCER = InferenceCoalescer(
+    churn_svc.churn_proba_records,
+    max_batch_rows=settings.coalesce_max_batch_rows,
+    max_wait_ms=settings.coalesce_max_wait_ms,
+)
+
+# --- Fast rejection when a compute pool is saturated ---
+@app.exception_handler(PoolSaturated)
+async def _pool_saturated_handler(request: Request, exc: PoolSaturated):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"ok": False, "error": exc.detail, "pool": exc.pool},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 # --- Load default CSV at startup ---
 try:
     default_df = pd.read_csv("your_products.csv")
@@ -94,154 +120,243 @@ def process_customer_data(df: pd.DataFrame) -> list:
         processed_data.append(customer)
     return processed_data
 
+def _compact(name: str, df: pd.DataFrame) -> pd.DataFrame:
+    compacted, report = compact_frame(df)
+    STORE.memory_reports[name] = report
+    print(f"[compaction] {name}: {report['bytes_before']:,} -> {report['bytes_after']:,} bytes ({report['saved_pct']}% saved)")
+    return compacted
+
 # ------------------- First App Routes -------------------
 
-@app.get("/products")
-def get_products():
-    if default_df.empty:
-        return []
-    processed_df = preprocess_data(default_df)
+def _forecast_records(df: pd.DataFrame) -> list:
+    processed_df = preprocess_data(df)
+    feature_df = feature_engineering(processed_df)
+    forecast_df = generate_forecast(feature_df, forecast_days=30)
+    return forecast_df.to_dict(orient="records")
+
+def _forecast_from_csv(contents: bytes) -> list:
+    uploaded_df = pd.read_csv(io.StringIO(contents.decode("utf-8-sig")))
+    processed_df = preprocess_data(uploaded_df)
     feature_df = feature_engineering(processed_df)
     forecast_df = generate_forecast(feature_df, forecast_days=30)
+    # seed the incremental state so daily deltas can go through /forecast/append/
+    FORECAST_STATE.rebuild(processed_df)
     return forecast_df.to_dict(orient="records")
 
+def _append_and_forecast(contents: bytes, only_updated: bool) -> dict:
+    new_rows = pd.read_csv(io.StringIO(contents.decode("utf-8-sig")))
+    result = FORECAST_STATE.append(new_rows)
+    product_ids = result["updated"] if only_updated else None
+    forecast_df = FORECAST_STATE.forecast(forecast_days=30, product_ids=product_ids)
+    return {**result, "forecast": forecast_df.to_dict(orient="records")}
+
+@app.get("/products")
+async def get_products():
+    if default_df.empty:
+        return []
+    return await EXECUTOR.run("forecasting", _forecast_records, default_df.copy())
+
 @app.post("/forecast/")
 async def forecast_sales(file: UploadFile = File(...)):
+    contents = await file.read()
     try:
-        contents = await file.read()
-        uploaded_df = pd.read_csv(io.StringIO(contents.decode("utf-8-sig")))
-        processed_df = preprocess_data(uploaded_df)
-        feature_df = feature_engineering(processed_df)
-        forecast_df = generate_forecast(feature_df, forecast_days=30)
-        return forecast_df.to_dict(orient="records")
+        return await EXECUTOR.run("forecasting", _forecast_from_csv, contents)
+    except PoolSaturated:
+        raise
     except Exception as e:
         print("Error in forecast_sales:", e)
         return {"error": str(e)}
 
-@app.post("/upload-customers/")
-async def upload_customers(file: UploadFile = File(...)):
+@app.post("/forecast/append/")
+async def forecast_append(file: UploadFile = File(...), only_updated: bool = False):
+    contents = await file.read()
     try:
-        # 1️⃣ Read uploaded CSV
-        contents = await file.read()
-        uploaded_df = pd.read_csv(io.StringIO(contents.decode("utf-8-sig")))
+        return await EXECUTOR.run("forecasting", _append_and_forecast, contents, only_updated)
+    except PoolSaturated:
+        raise
+    except Exception as e:
+        print("Error in forecast_append:", e)
+        return {"error": str(e)}
 
-        # 2️⃣ Required columns for backend processing
-        required_columns = [
-            "order_id", "customer_id", "product_id", "unit_price", "quantity"
-        ]
-        missing_required = [col for col in required_columns if col not in uploaded_df.columns]
-        if missing_required:
-            return {"error": f"Missing required columns: {', '.join(missing_required)}"}
-
-        # 3️⃣ Fill optional columns with defaults if missing
-        optional_defaults = {
-            "age": 30,
-            "gender": "Other",
-            "country": "Unknown",
-            "signup_date": "",
-            "last_purchase_date": "",
-            "cancellations_count": 0,
-            "subscription_status": "Active",
-            "purchase_frequency": 1,
-            "product_name": "Unknown",
-            "category": "Misc",
-            "ratings": 3
-        }
-        for col, default in optional_defaults.items():
-            if col not in uploaded_df.columns:
-                uploaded_df[col] = default
-
-        # 4️⃣ Process & feature engineering
-        processed_data = []
-        for _, row in uploaded_df.iterrows():
-            customer = {
-                "order_id": str(row["order_id"]),
-                "customer_id": str(row["customer_id"]),
-                "age": int(row["age"]),
-                "gender": str(row["gender"]),
-                "product_id": str(row["product_id"]),
-                "country": str(row["country"]),
-                "signup_date": str(row["signup_date"]),
-                "last_purchase_date": str(row["last_purchase_date"]),
-                "cancellations_count": int(row["cancellations_count"]),
-                "subscription_status": str(row["subscription_status"]),
-                "unit_price": float(row["unit_price"]),
-                "quantity": int(row["quantity"]),
-                "purchase_frequency": int(row["purchase_frequency"]),
-                "product_name": str(row["product_name"]),
-                "category": str(row["category"]),
-                "ratings": float(row["ratings"]),
-            }
-
-            # Feature engineering
-            customer["age_group"] = (
-                "Under 25" if customer["age"] < 25 else
-                "25-34" if customer["age"] < 35 else
-                "35-44" if customer["age"] < 45 else
-                "45-59" if customer["age"] < 60 else
-                "60+"
-            )
-            if customer["last_purchase_date"]:
-                last_date = pd.to_datetime(customer["last_purchase_date"], errors="coerce")
-                months_since = (pd.Timestamp.now() - last_date).days // 30 if last_date is not pd.NaT else 0
-                customer["months_since_last_purchase"] = months_since
-            else:
-                customer["months_since_last_purchase"] = 0
-
-            # Lifetime value
-            customer["lifetime_value"] = customer["unit_price"] * customer["quantity"] * customer["purchase_frequency"]
-
-            # Churn scoring
-            churn_score = 0
-            if customer["age"] < 25: churn_score += 0.1
-            if customer["age"] > 60: churn_score += 0.2
-            churn_score += customer["cancellations_count"] * 0.15
-            if customer["purchase_frequency"] < 2: churn_score += 0.2
-            if customer["subscription_status"] == "Inactive": churn_score += 0.25
-            if customer["subscription_status"] == "Cancelled": churn_score += 0.5
-            if customer["ratings"] < 3: churn_score += 0.2
-            elif customer["ratings"] < 4: churn_score += 0.1
-            churn_score = min(max(churn_score, 0), 1)
-            customer["churn_probability"] = churn_score
-            customer["churn_risk"] = (
-                "High" if churn_score > 0.7 else
-                "Medium" if churn_score > 0.4 else
-                "Low"
-            )
-
-            # Promotion eligibility
-            customer["promotion_eligible"] = (
-                customer["lifetime_value"] > 1000 and
-                customer["ratings"] >= 4 and
-                customer["subscription_status"] == "Active"
-            )
-            customer["retention_strategy"] = "Personalized retention offer"
-
-            processed_data.append(customer)
-
-        # 5️⃣ Update STORE
-        df_processed = pd.DataFrame(processed_data)
-        STORE.df_customers = df_processed.copy()
-
-        # 6️⃣ Train churn model
-        churn_scores = churn_svc.train_churn(STORE.df_customers)
-        best_model = max(churn_scores, key=lambda k: churn_scores[k])
-        print(f"Churn model trained. Best model: {best_model} with accuracy {churn_scores[best_model]}")
-
-        # 7️⃣ Generate predictions
-        records = df_processed.to_dict(orient="records")
-        predictions = churn_svc.churn_proba(df_processed)
-        segments = churn_svc.segments_from_proba(predictions)
-        for i, rec in enumerate(records):
-            rec["churn_probability"] = float(predictions[i])
-            rec["churn_segment"] = segments[i]
-
-        return {"data": records, "message": "File uploaded successfully, churn model trained, predictions generated."}
+@app.get("/forecast/state")
+def forecast_state():
+    return FORECAST_STATE.summary()
 
+@app.post("/upload-customers/")
+async def upload_customers(file: UploadFile = File(...)):
+    contents = await file.read()
+    try:
+        return await EXECUTOR.run("training", _ingest_customers, contents)
+    except PoolSaturated:
+        raise
     except Exception as e:
         print("Error in upload_customers:", e)
         return {"error": str(e)}
 
+def _ingest_customers(contents: bytes) -> dict:
+    # 0️⃣ Identical bytes seen before today: reuse the scored frame and its churn model.
+    # months_since_last_purchase is relative to today, so scored output is cached per day.
+    sha, _, _ = INGEST.put_bytes(contents, ".csv")
+    as_of = pd.Timestamp.now().strftime("%Y-%m-%d")
+    data_hash = f"{sha}@{as_of}"
+    scored_name = f"customers_scored-{as_of}"
+    unscored_name = f"customers_unscored-{as_of}"
+    cached = INGEST.load_frame(sha, scored_name)
+    unscored = INGEST.load_frame(sha, unscored_name) if cached is not None else None
+    if unscored is not None and INGEST.restore_models(*_model_key(data_hash, "customers")) is not None:
+        df_processed, meta = cached
+        STORE.memory_reports.update(meta.get("memory_reports", {}))
+        # the frame the model was trained on, with the heuristic churn_probability
+        STORE.df_customers = unscored[0]
+        STORE.data_hash = data_hash
+        _build_sample("churn", STORE.df_customers, sha, f"-{as_of}")
+        ds = _register_dataset(df_processed, f"customers-{sha[:24]}-{as_of}", meta.get("summary"))
+        return {
+            "dataset_id": ds.dataset_id,
+            "summary": ds.summary,
+            "message": "File already processed today; reused cached predictions and churn model.",
+        }
+
+    # 1️⃣ Read uploaded CSV (parsed frame is cached by content hash)
+    parsed = INGEST.load_frame(sha, "parsed")
+    if parsed is not None:
+        uploaded_df = parsed[0]
+    else:
+        uploaded_df = pd.read_csv(io.StringIO(contents.decode("utf-8-sig")))
+        INGEST.save_frame(sha, "parsed", uploaded_df)
+
+    # 2️⃣ Required columns for backend processing
+    required_columns = [
+        "order_id", "customer_id", "product_id", "unit_price", "quantity"
+    ]
+    missing_required = [col for col in required_columns if col not in uploaded_df.columns]
+    if missing_required:
+        return {"error": f"Missing required columns: {', '.join(missing_required)}"}
+
+    # 3️⃣ Fill optional columns with defaults if missing
+    optional_defaults = {
+        "age": 30,
+        "gender": "Other",
+        "country": "Unknown",
+        "signup_date": "",
+        "last_purchase_date": "",
+        "cancellations_count": 0,
+        "subscription_status": "Active",
+        "purchase_frequency": 1,
+        "product_name": "Unknown",
+        "category": "Misc",
+        "ratings": 3
+    }
+    for col, default in optional_defaults.items():
+        if col not in uploaded_df.columns:
+            uploaded_df[col] = default
+
+    # Keep the churn label, if the file has one, so trends and training see it
+    # rather than the heuristic churn_probability below
+    label_col = find_churn_col(uploaded_df)
+    if label_col is not None and to_bool_series(uploaded_df[label_col]).isna().all():
+        label_col = None
+
+    # 4️⃣ Process & feature engineering
+    processed_data = []
+    for _, row in uploaded_df.iterrows():
+        customer = {
+            "order_id": str(row["order_id"]),
+            "customer_id": str(row["customer_id"]),
+            "age": int(row["age"]),
+            "gender": str(row["gender"]),
+            "product_id": str(row["product_id"]),
+            "country": str(row["country"]),
+            "signup_date": str(row["signup_date"]),
+            "last_purchase_date": str(row["last_purchase_date"]),
+            "cancellations_count": int(row["cancellations_count"]),
+            "subscription_status": str(row["subscription_status"]),
+            "unit_price": float(row["unit_price"]),
+            "quantity": int(row["quantity"]),
+            "purchase_frequency": int(row["purchase_frequency"]),
+            "product_name": str(row["product_name"]),
+            "category": str(row["category"]),
+            "ratings": float(row["ratings"]),
+        }
+        if label_col is not None:
+            customer[label_col] = row[label_col]
+
+        # Feature engineering
+        customer["age_group"] = (
+            "Under 25" if customer["age"] < 25 else
+            "25-34" if customer["age"] < 35 else
+            "35-44" if customer["age"] < 45 else
+            "45-59" if customer["age"] < 60 else
+            "60+"
+        )
+        if customer["last_purchase_date"]:
+            last_date = pd.to_datetime(customer["last_purchase_date"], errors="coerce")
+            months_since = (pd.Timestamp.now() - last_date).days // 30 if last_date is not pd.NaT else 0
+            customer["months_since_last_purchase"] = months_since
+        else:
+            customer["months_since_last_purchase"] = 0
+
+        # Lifetime value
+        customer["lifetime_value"] = customer["unit_price"] * customer["quantity"] * customer["purchase_frequency"]
+
+        # Churn scoring
+        churn_score = 0
+        if customer["age"] < 25: churn_score += 0.1
+        if customer["age"] > 60: churn_score += 0.2
+        churn_score += customer["cancellations_count"] * 0.15
+        if customer["purchase_frequency"] < 2: churn_score += 0.2
+        if customer["subscription_status"] == "Inactive": churn_score += 0.25
+        if customer["subscription_status"] == "Cancelled": churn_score += 0.5
+        if customer["ratings"] < 3: churn_score += 0.2
+        elif customer["ratings"] < 4: churn_score += 0.1
+        churn_score = min(max(churn_score, 0), 1)
+        customer["churn_probability"] = churn_score
+        customer["churn_risk"] = (
+            "High" if churn_score > 0.7 else
+            "Medium" if churn_score > 0.4 else
+            "Low"
+        )
+
+        # Promotion eligibility
+        customer["promotion_eligible"] = (
+            customer["lifetime_value"] > 1000 and
+            customer["ratings"] >= 4 and
+            customer["subscription_status"] == "Active"
+        )
+        customer["retention_strategy"] = "Personalized retention offer"
+
+        processed_data.append(customer)
+
+    # 5️⃣ Update STORE
+    df_processed = _compact("customers", pd.DataFrame(processed_data))
+    STORE.df_customers = df_processed.copy()
+    STORE.data_hash = data_hash
+    _build_sample("churn", STORE.df_customers, sha, f"-{as_of}")
+
+    # 6️⃣ Train churn model
+    churn_scores = _train_churn_cached(STORE.df_customers, _model_key(data_hash, "customers"))
+    best_model = max(churn_scores, key=lambda k: churn_scores[k])
+    print(f"Churn model trained. Best model: {best_model} with accuracy {churn_scores[best_model]}")
+
+    # 7️⃣ Generate predictions
+    predictions = churn_svc.churn_proba(df_processed.copy())
+    df_processed["churn_probability"] = predictions.astype(float)
+    df_processed["churn_segment"] = churn_svc.segments_from_proba(predictions)
+    df_processed = _compact("customers_scored", df_processed)
+
+    # 8️⃣ Register the scored frame; rows are fetched page by page from /api/datasets
+    ds = _register_dataset(df_processed, f"customers-{sha[:24]}-{as_of}")
+    memory_reports = {k: STORE.memory_reports[k] for k in ("customers", "customers_scored")}
+    INGEST.save_frame(sha, unscored_name, STORE.df_customers, replaces="customers_unscored-")
+    INGEST.save_frame(sha, scored_name, df_processed,
+                      {"summary": ds.summary, "memory_reports": memory_reports},
+                      replaces="customers_scored-")
+    return {
+        "dataset_id": ds.dataset_id,
+        "summary": ds.summary,
+        "message": "File uploaded successfully, churn model trained, predictions generated.",
+    }
+
 @app.get("/")
 def root():
     return {"message": "Welcome to the Combined Sales & CustomerMetrics API."}
@@ -252,14 +367,148 @@ def root():
 def health():
     return {"ok": True, "message": "up"}
 
-@app.post("/api/data/load", response_model=dict)
-def load_data(req: LoadDataRequest):
-    df = smart_read(req.path)
-    STORE.df_raw = df.copy()
+@app.get("/api/compute/stats", response_model=dict)
+def compute_stats():
+    return {"ok": True, "pools": EXECUTOR.stats(), "predict_coalescer": PREDICT_COALESCER.stats()}
+
+def _model_key(data_hash: str, frame: str) -> Tuple[str, str]:
+    # (cache entry, model key): models are evicted together with the data they were trained on
+    return entry_of(data_hash), f"churn:{data_hash}:{frame}"
+
+def _train_churn_cached(df: pd.DataFrame, key: Optional[Tuple[str, str]]) -> dict:
+    # train_churn is seeded, so models trained on identical data can be reused as-is
+    if key is not None:
+        scores = INGEST.restore_models(*key)
+        if scores is not None:
+            print(f"[ingest] Reusing churn model trained on {key[1]}")
+            return scores
+    scores = churn_svc.train_churn(df)
+    if key is not None:
+        INGEST.save_models(*key, scores)
+    return scores
+
+def _current_model_key() -> Optional[Tuple[str, str]]:
+    if STORE.data_hash is None:
+        return None
+    return _model_key(STORE.data_hash, "customers" if STORE.df_customers is not None else "raw")
+
+def _register_dataset(df: pd.DataFrame, dataset_id: str, summary: Optional[dict] = None):
+    return DATASETS.get(dataset_id) or DATASETS.register(df, dataset_id, summary)
+
+def _load_into_store(path: str) -> pd.DataFrame:
+    # parsing + compaction is cached by the file's content hash
+    sha = INGEST.hash_file(path)
+    cached = INGEST.load_frame(sha, "raw")
+    if cached is not None:
+        df, meta = cached
+        STORE.memory_reports["raw"] = meta.get("memory_report", {})
+    else:
+        df = _compact("raw", smart_read(path))
+        INGEST.save_frame(sha, "raw", df, {"memory_report": STORE.memory_reports["raw"], "source": str(path)})
+    # shared with the dataset registry: both only ever read it
+    STORE.df_raw = df
+    STORE.data_hash = sha
     cust, sales = churn_svc.split_customer_sales(df)
     STORE.df_customers = cust if not cust.empty else None
     STORE.df_sales = sales if not sales.empty else None
-    return {"ok": True, "rows": len(df), "columns": df.columns.tolist()}
+    _build_sample("churn", STORE.df_customers if STORE.df_customers is not None else df, sha)
+    _build_sample("sales", STORE.df_sales if STORE.df_sales is not None else df, sha)
+    return df
+
+_SAMPLE_STRATA = {"churn": churn_svc.churn_sample_strata, "sales": sales_svc.sales_sample_strata}
+
+def _build_sample(kind: str, df: Optional[pd.DataFrame], sha: str, tag: str = ""):
+    # stratified sample for mode=approx; `sha` must be the hash of the content `df` came from,
+    # since the sample is cached under it
+    STORE.samples.pop(kind, None)
+    if df is None:
+        return
+    name = f"sample-{kind}{tag}"
+    cached = INGEST.load_frame(sha, name)
+    if cached is not None:
+        STORE.samples[kind] = sampling.from_frame(*cached)
+        return
+    try:
+        strata, meta = _SAMPLE_STRATA[kind](df)
+        sample = sampling.build_sample(df, strata, settings.sample_rows, settings.sample_min_per_stratum,
+                                       settings.sample_seed, meta)
+    except ValueError as e:
+        print(f"[sampling] No {kind} sample: {e}")
+        return
+    rows, info = sampling.to_frame(sample)
+    INGEST.save_frame(sha, name, rows, info, replaces=f"sample-{kind}-" if tag else None)
+    STORE.samples[kind] = sample
+
+def _require_sample(kind: str):
+    sample = STORE.samples.get(kind)
+    if sample is None:
+        raise HTTPException(409, f"No {kind} sample for approximate mode. Load data with the needed columns or use mode=exact.")
+    return sample
+
+async def _run_approx(pool: str, fn, *args, **kwargs):
+    # estimators reject sample sizes they cannot honour (fewer rows than strata)
+    try:
+        return await EXECUTOR.run(pool, fn, *args, **kwargs)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+def _load_dataset(path: str):
+    df = _load_into_store(path)
+    return df, _register_dataset(df, f"raw-{STORE.data_hash[:24]}")
+
+@app.post("/api/data/load", response_model=dict)
+async def load_data(req: LoadDataRequest):
+    df, ds = await EXECUTOR.run("training", _load_dataset, req.path)
+    return {"ok": True, "rows": len(df), "columns": df.columns.tolist(), "dataset_id": ds.dataset_id}
+
+@app.get("/api/data/ingest", response_model=dict)
+def data_ingest():
+    return {"ok": True, "data_hash": STORE.data_hash, **INGEST.stats()}
+
+@app.get("/api/data/memory", response_model=dict)
+def data_memory():
+    return {"ok": True, "frames": STORE.memory_reports}
+
+@app.get("/api/datasets/{dataset_id}", response_model=DatasetSummaryResponse)
+def dataset_summary(dataset_id: str):
+    ds = DATASETS.get(dataset_id)
+    if ds is None:
+        raise HTTPException(404, f"Unknown dataset: {dataset_id}")
+    return DatasetSummaryResponse(ok=True, dataset_id=ds.dataset_id, summary=ds.summary)
+
+def _render_records(ds, columns, filters, sort, order, limit, cursor, fmt) -> Response:
+    page, next_cursor, total = datasets_svc.query_page(
+        ds,
+        columns=[c for c in columns.split(",") if c] if columns else None,
+        filters=filters,
+        sort=sort,
+        descending=order == "desc",
+        limit=limit,
+        cursor=cursor,
+    )
+    meta = {"ok": True, "dataset_id": ds.dataset_id, "total": total, "count": len(page), "next_cursor": next_cursor}
+    if fmt == "arrow":
+        return Response(datasets_svc.page_to_arrow(page, meta), media_type=datasets_svc.ARROW_MEDIA_TYPE)
+    return Response(datasets_svc.page_to_json(page, meta), media_type="application/json")
+
+@app.get("/api/datasets/{dataset_id}/records")
+async def dataset_records(
+    dataset_id: str,
+    columns: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    filter: List[str] = Query([], description="Repeatable column:op:value (eq, ne, gt, gte, lt, lte, in, contains)"),
+    sort: Optional[str] = None,
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    limit: int = Query(500, ge=1, le=datasets_svc.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|arrow)$"),
+):
+    ds = DATASETS.get(dataset_id)
+    if ds is None:
+        raise HTTPException(404, f"Unknown dataset: {dataset_id}")
+    try:
+        return await EXECUTOR.run("inference", _render_records, ds, columns, filter, sort, order, limit, cursor, format)
+    except datasets_svc.QueryError as e:
+        raise HTTPException(400, str(e))
 
 @app.post("/api/data/upload", response_model=dict)
 async def upload_data(file: UploadFile = File(...)):
@@ -268,66 +517,131 @@ async def upload_data(file: UploadFile = File(...)):
         raise HTTPException(400, "Supported types: CSV, XLS, XLSX")
     target = Path("app/data") / file.filename
     content = await file.read()
-    target.write_bytes(content)
-    return {"ok": True, "saved_to": str(target)}
+    sha, blob, deduplicated = await EXECUTOR.run("inference", _store_upload, content, suffix, target)
+    return {"ok": True, "saved_to": str(target), "sha256": sha, "blob": str(blob), "deduplicated": deduplicated}
+
+def _store_upload(content: bytes, suffix: str, target: Path):
+    sha, blob, deduplicated = INGEST.put_bytes(content, suffix)
+    # keep the named copy for /api/data/load, rewriting it only when the content changed
+    if not (target.exists() and INGEST.hash_file(target) == sha):
+        target.write_bytes(content)
+    return sha, blob, deduplicated
 
 @app.post("/api/churn/train", response_model=TrainResponse)
-def churn_train():
+async def churn_train(budget_seconds: Optional[float] = Query(None, gt=0, description="Run budgeted successive-halving selection instead of the fixed candidates")):
     if STORE.df_customers is None and STORE.df_raw is None:
         raise HTTPException(400, "No data loaded. POST /api/data/load first.")
     df = STORE.df_customers if STORE.df_customers is not None else STORE.df_raw
-    scores = churn_svc.train_churn(df)
+    if budget_seconds is not None:
+        try:
+            result = await EXECUTOR.run("training", churn_svc.train_churn_budgeted, df, budget_seconds)
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+        scores = result["scores"]
+        return TrainResponse(ok=True, models=scores, best_model=result["best_model"], best_accuracy=result["best_accuracy"],
+                             worst_accuracy=min(scores.values()), leaderboard=result["leaderboard"], timings=result["timings"])
+    scores = await EXECUTOR.run("training", _train_churn_cached, df, _current_model_key())
     best_model = max(scores, key=lambda k: scores[k])
     worst_model = min(scores, key=lambda k: scores[k])
     return TrainResponse(ok=True, models=scores, best_model=best_model, best_accuracy=scores[best_model], worst_accuracy=scores[worst_model])
 
 @app.post("/api/churn/predict", response_model=PredictResponse)
-def churn_predict(req: PredictRequest):
-    df = pd.DataFrame(req.records)
-    proba = churn_svc.churn_proba(df)
+async def churn_predict(req: PredictRequest):
+    if settings.coalesce_predictions:
+        proba = await PREDICT_COALESCER.submit(req.records)
+    else:
+        proba = await EXECUTOR.run("inference", churn_svc.churn_proba_records, req.records)
+    segs = churn_svc.segments_from_proba(proba)
+    out = [{"index": i, "churn_probability": float(p), "segment": s} for i, (p, s) in enumerate(zip(proba, segs))]
+    return PredictResponse(ok=True, predictions=out)
+
+# Small requests are scored inline: the compiled scorer is pure NumPy and
+# a threadpool hop would cost more than the math.
+FAST_INLINE_MAX_RECORDS = 64
+
+@app.post("/api/churn/predict/fast", response_model=PredictResponse)
+async def churn_predict_fast(req: PredictRequest):
+    scorer = get_scorer()
+    if scorer is None:
+        raise HTTPException(409, "No compiled churn scorer. Train a logreg/rf/gb churn model first.")
+    try:
+        if len(req.records) <= FAST_INLINE_MAX_RECORDS:
+            proba = scorer.predict_proba(req.records)
+        else:
+            proba = await EXECUTOR.run("inference", scorer.predict_proba, req.records)
+    except (TypeError, ValueError) as e:
+        raise HTTPException(400, f"Invalid record: {e}")
     segs = churn_svc.segments_from_proba(proba)
     out = [{"index": i, "churn_probability": float(p), "segment": s} for i, (p, s) in enumerate(zip(proba, segs))]
     return PredictResponse(ok=True, predictions=out)
 
 @app.get("/api/churn/top", response_model=TopChurnResponse)
-def churn_top(n: int = 10):
+async def churn_top(n: int = 10):
     if STORE.df_customers is None and STORE.df_raw is None:
         raise HTTPException(400, "No data loaded.")
     df = STORE.df_customers if STORE.df_customers is not None else STORE.df_raw
-    top = churn_svc.build_top_churn(df, n=n)
+    top = await EXECUTOR.run("inference", churn_svc.build_top_churn, df, n=n)
     items = [TopChurnItem(customer_id=row["customer_id"], probability=float(row["probability"]), segment=row["segment"]) for _, row in top.iterrows()]
     return TopChurnResponse(ok=True, items=items)
 
 @app.get("/api/churn/segments", response_model=SegmentsResponse)
-def churn_segments():
+async def churn_segments(
+    mode: str = Query("exact", pattern="^(exact|approx)$", description="approx: estimate from the stratified sample"),
+    sample_size: Optional[int] = Query(None, ge=1, description="Rows of the sample to use in approx mode (default: all)"),
+):
     if STORE.df_customers is None and STORE.df_raw is None:
         raise HTTPException(400, "No data loaded.")
+    if mode == "approx":
+        sample = _require_sample("churn")
+        counts, intervals, used = await _run_approx("inference", churn_svc.churn_segments_approx, sample,
+                                                    sample_size, settings.sample_confidence)
+        return SegmentsResponse(ok=True, by_segment=counts, intervals=intervals, mode=mode, sample_rows=used,
+                                population_rows=sample.population_rows, confidence=settings.sample_confidence)
     df = STORE.df_customers if STORE.df_customers is not None else STORE.df_raw
-    summary = churn_svc.churn_segments_summary(df)
+    summary = await EXECUTOR.run("inference", churn_svc.churn_segments_summary, df)
     return SegmentsResponse(ok=True, by_segment=summary)
 
 @app.get("/api/churn/trends", response_model=TrendsResponse)
-def churn_trends():
+async def churn_trends(
+    mode: str = Query("exact", pattern="^(exact|approx)$", description="approx: estimate from the stratified sample"),
+    sample_size: Optional[int] = Query(None, ge=1, description="Rows of the sample to use in approx mode (default: all)"),
+):
     if STORE.df_customers is None and STORE.df_raw is None:
         raise HTTPException(400, "No data loaded.")
+    if mode == "approx":
+        sample = _require_sample("churn")
+        periods, rates, intervals, used = await _run_approx("inference", churn_svc.churn_rate_trend_approx, sample,
+                                                            sample_size, settings.sample_confidence)
+        return TrendsResponse(ok=True, periods=periods, churn_rate=rates, intervals=intervals, mode=mode, sample_rows=used,
+                              population_rows=sample.population_rows, confidence=settings.sample_confidence)
     df = STORE.df_customers if STORE.df_customers is not None else STORE.df_raw
-    periods, rates = churn_svc.churn_rate_trend(df)
+    periods, rates = await EXECUTOR.run("inference", churn_svc.churn_rate_trend, df)
     return TrendsResponse(ok=True, periods=periods, churn_rate=rates)
 
 @app.get("/api/sales/forecast", response_model=ForecastResponse)
-def sales_forecast(horizon: int = 3):
+async def sales_forecast(horizon: int = 3):
     if STORE.df_sales is None and STORE.df_raw is None:
         raise HTTPException(400, "No data loaded.")
     df = STORE.df_sales if STORE.df_sales is not None else STORE.df_raw
-    periods, forecast, freq = sales_svc.forecast_total(df, horizon=horizon)
+    periods, forecast, freq = await EXECUTOR.run("forecasting", sales_svc.forecast_total, df, horizon=horizon)
     return ForecastResponse(ok=True, periods=periods, forecast=forecast, frequency=freq)
 
 @app.get("/api/sales/top-products", response_model=TopProductsResponse)
-def sales_top_products(n: int = 10):
+async def sales_top_products(
+    n: int = 10,
+    mode: str = Query("exact", pattern="^(exact|approx)$", description="approx: estimate from the stratified sample"),
+    sample_size: Optional[int] = Query(None, ge=1, description="Rows of the sample to use in approx mode (default: all)"),
+):
     if STORE.df_sales is None and STORE.df_raw is None:
         raise HTTPException(400, "No data loaded.")
+    if mode == "approx":
+        sample = _require_sample("sales")
+        items, used = await _run_approx("forecasting", sales_svc.top_products_approx, sample, n=n,
+                                        sample_size=sample_size, confidence=settings.sample_confidence)
+        return TopProductsResponse(ok=True, items=items, mode=mode, sample_rows=used,
+                                   population_rows=sample.population_rows, confidence=settings.sample_confidence)
     df = STORE.df_sales if STORE.df_sales is not None else STORE.df_raw
-    items = sales_svc.top_products(df, n=n)
+    items = await EXECUTOR.run("forecasting", sales_svc.top_products, df, n=n)
     return TopProductsResponse(ok=True, items=items)
 
 # --- Startup autoload ---
@@ -345,11 +659,13 @@ def _autoload():
         p = Path(settings.default_data_path)
         if p.exists():
             try:
-                df = smart_read(str(p))
-                STORE.df_raw = df.copy()
-                cust, sales = churn_svc.split_customer_sales(df)
-                STORE.df_customers = cust if not cust.empty else None
-                STORE.df_sales = sales if not sales.empty else None
-                churn_svc.train_churn(STORE.df_customers if STORE.df_customers is not None else STORE.df_raw)
+                _load_into_store(str(p))
+                _train_churn_cached(STORE.df_customers if STORE.df_customers is not None else STORE.df_raw,
+                                    _current_model_key())
             except Exception as e:
                 print(f"[startup] Skipped autoload: {e}")
+
+@app.on_event("shutdown")
+def _shutdown_compute():
+    EXECUTOR.shutdown(wait=False)
+    churn_svc.shutdown_selection_pool()
@@ -47,62 +47,84 @@ def feature_engineering(data: pd.DataFrame) -> pd.DataFrame:
     feature_df = feature_df.reset_index(drop=True)
     return feature_df
 
+STATIC_COLUMNS = ['age', 'unit_price', 'quantity', 'purchase_frequency', 'cancellations_count', 'Ratings']
+HISTORY_WINDOW = 30  # longest lag/rolling window used by the recursive forecaster
+
+def forecast_product(pid, last_known_sales: list, last_date: pd.Timestamp, static: dict,
+                     max_sales: float, forecast_days: int = 30) -> list:
+    """Recursive forecast for one product from its recent sales and last-row attributes.
+
+    Only the last `HISTORY_WINDOW` sales values are read, so callers may pass
+    just that tail instead of the full history.
+    """
+    last_known_sales = list(last_known_sales)
+    forecasts = []
+
+    for day in range(1, forecast_days + 1):
+        future_date = last_date + pd.Timedelta(days=1)
+        last_date = future_date
+
+        feat = {}
+        feat['day_of_week'] = future_date.dayofweek
+        feat['month'] = future_date.month
+        feat['weekofyear'] = future_date.isocalendar()[1]
+
+        # Lag features
+        for lag in [1, 2, 3, 7, 14, 30]:
+            feat[f'lag_{lag}'] = last_known_sales[-lag] if len(last_known_sales) >= lag else 0
+
+        # Rolling stats
+        for window in [7, 14, 30]:
+            if len(last_known_sales) >= window:
+                roll = last_known_sales[-window:]
+                feat[f'roll_mean_{window}'] = np.mean(roll)
+                feat[f'roll_std_{window}'] = np.std(roll)
+            else:
+                feat[f'roll_mean_{window}'] = 0
+                feat[f'roll_std_{window}'] = 0
+
+        # Differences
+        feat['diff_1'] = last_known_sales[-1] - last_known_sales[-2] if len(last_known_sales) > 1 else 0
+        feat['diff_7'] = last_known_sales[-1] - last_known_sales[-8] if len(last_known_sales) > 7 else 0
+
+        # Extra columns from last row
+        for col in STATIC_COLUMNS:
+            feat[col] = static.get(col, 0)
+
+        feat_df = pd.DataFrame([feat])
+
+        # Predict
+        pred_log = model.predict(feat_df)[0]
+        pred_sales = np.expm1(pred_log)
+
+        # Clip extreme values
+        min_sales = 0
+        pred_sales = np.clip(pred_sales, min_sales, max_sales * 1.5)
+
+        last_known_sales.append(pred_sales)
+
+        forecasts.append({
+            'product_id': pid,
+            'date': str(future_date.date()),
+            'predicted_sales': float(pred_sales)
+        })
+
+    return forecasts
+
 def generate_forecast(feature_df: pd.DataFrame, forecast_days: int = 30) -> pd.DataFrame:
     all_forecasts = []
 
     for pid in feature_df['product_id'].unique():
         product_data = feature_df[feature_df['product_id'] == pid].copy().sort_values('last_purchase_date')
 
-        last_known_sales = product_data['sales'].tolist()
-        last_dates = product_data['last_purchase_date'].tolist()
-
-        for day in range(1, forecast_days + 1):
-            future_date = last_dates[-1] + pd.Timedelta(days=1)
-            last_dates.append(future_date)
-
-            feat = {}
-            feat['day_of_week'] = future_date.dayofweek
-            feat['month'] = future_date.month
-            feat['weekofyear'] = future_date.isocalendar()[1]
-
-            # Lag features
-            for lag in [1, 2, 3, 7, 14, 30]:
-                feat[f'lag_{lag}'] = last_known_sales[-lag] if len(last_known_sales) >= lag else 0
-
-            # Rolling stats
-            for window in [7, 14, 30]:
-                if len(last_known_sales) >= window:
-                    roll = last_known_sales[-window:]
-                    feat[f'roll_mean_{window}'] = np.mean(roll)
-                    feat[f'roll_std_{window}'] = np.std(roll)
-                else:
-                    feat[f'roll_mean_{window}'] = 0
-                    feat[f'roll_std_{window}'] = 0
-
-            # Differences
-            feat['diff_1'] = last_known_sales[-1] - last_known_sales[-2] if len(last_known_sales) > 1 else 0
-            feat['diff_7'] = last_known_sales[-1] - last_known_sales[-8] if len(last_known_sales) > 7 else 0
-
-            # Extra columns from last row
-            for col in ['age', 'unit_price', 'quantity', 'purchase_frequency', 'cancellations_count', 'Ratings']:
-                feat[col] = product_data[col].iloc[-1] if col in product_data.columns else 0
-
-            feat_df = pd.DataFrame([feat])
-
-            # Predict
-            pred_log = model.predict(feat_df)[0]
-            pred_sales = np.expm1(pred_log)
-
-            # Clip extreme values
-            min_sales, max_sales = 0, product_data['sales'].max() * 1.5
-            pred_sales = np.clip(pred_sales, min_sales, max_sales)
-
-            last_known_sales.append(pred_sales)
-
-            all_forecasts.append({
-                'product_id': pid,
-                'date': str(future_date.date()),
-                'predicted_sales': float(pred_sales)
-            })
+        static = {col: product_data[col].iloc[-1] for col in STATIC_COLUMNS if col in product_data.columns}
+        all_forecasts.extend(forecast_product(
+            pid,
+            product_data['sales'].tolist()[-HISTORY_WINDOW:],
+            product_data['last_purchase_date'].iloc[-1],
+            static,
+            product_data['sales'].max(),
+            forecast_days,
+        ))
 
     return pd.DataFrame(all_forecasts)
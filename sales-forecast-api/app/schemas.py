@@ -10,6 +10,9 @@ class TrainResponse(BaseModel):
     best_model: str
     best_accuracy: float
     worst_accuracy: float
+    # set by budgeted model selection only
+    leaderboard: Optional[List[Dict[str, Any]]] = None
+    timings: Optional[Dict[str, Any]] = None
 
 class PredictRequest(BaseModel):
     records: List[Dict[str, Any]]
@@ -27,14 +30,23 @@ class TopChurnResponse(BaseModel):
     ok: bool
     items: List[TopChurnItem]
 
-class SegmentsResponse(BaseModel):
+class ApproxInfo(BaseModel):
+    # sample size and population behind mode=approx estimates; unset for exact results
+    mode: str = "exact"
+    sample_rows: Optional[int] = None
+    population_rows: Optional[int] = None
+    confidence: Optional[float] = None
+
+class SegmentsResponse(ApproxInfo):
     ok: bool
     by_segment: Dict[str, int]
+    intervals: Optional[Dict[str, List[float]]] = None  # segment -> [low, high] count
 
-class TrendsResponse(BaseModel):
+class TrendsResponse(ApproxInfo):
     ok: bool
     periods: List[str]
     churn_rate: List[float]
+    intervals: Optional[List[List[float]]] = None  # per period [low, high] churn rate in %
 
 class ForecastResponse(BaseModel):
     ok: bool
@@ -42,6 +54,11 @@ class ForecastResponse(BaseModel):
     periods: List[str]
     forecast: List[float]
 
-class TopProductsResponse(BaseModel):
+class TopProductsResponse(ApproxInfo):
+    ok: bool
+    items: List[Dict[str, Any]]  # approx items also carry "interval": [low, high]
+
+class DatasetSummaryResponse(BaseModel):
     ok: bool
-    items: List[Dict[str, Any]]
+    dataset_id: str
+    summary: Dict[str, Any]
@@ -1,7 +1,16 @@
 from __future__ import annotations
+import math
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
 import pandas as pd
 import numpy as np
-from typing import Dict, Tuple, List
+from typing import Any, Dict, Tuple, List, Optional
+import joblib
+from joblib import effective_n_jobs
+from sklearn.base import clone
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import OneHotEncoder, StandardScaler
@@ -10,7 +19,13 @@ from sklearn.linear_model import LogisticRegression
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
 from sklearn.metrics import accuracy_score
 from sklearn.model_selection import train_test_split
-from .common import STORE, find_churn_col, find_customer_id_col
+from .common import STORE, find_churn_col, find_customer_id_col, to_datetime_series
+from .compaction import expand_for_sklearn
+from .scorer import export_scorer
+from .sampling import (StratifiedSample, STRATUM_COL, PRIORITY_COL, WEIGHT_COL,
+                       stratified_total, proportion_interval)
+
+PARITY_SAMPLE_ROWS = 500
 
 def split_customer_sales(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
     # naive split: if there is a churn column we treat it as customer-level table
@@ -41,7 +56,7 @@ def _prepare_xy(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.Series, List[str]]:
     y = y.loc[mask].astype(int)
 
     # drop target column
-    X = df.drop(columns=[churn_col])
+    X = expand_for_sklearn(df.drop(columns=[churn_col]))
     # choose features: drop leakage obvious ids
     # keep all others; types will be handled by ColumnTransformer
     features = list(X.columns)
@@ -95,8 +110,325 @@ def train_churn(df: pd.DataFrame, test_size: float = 0.2, random_state: int = 42
     fitted_pre = best_pipe.named_steps["pre"]
     from .common import STORE
     STORE.save_churn_artifacts(fitted_pre, best_pipe.named_steps["clf"], features)
+    export_scorer(fitted_pre, best_pipe.named_steps["clf"], X_test.head(PARITY_SAMPLE_ROWS))
     return scores
 
+# Search space for budgeted selection: (family, estimator, params)
+def _search_space(random_state: int) -> List[Tuple[str, Any, Dict[str, Any]]]:
+    space = []
+    for C in [0.1, 1.0, 10.0]:
+        space.append(("logreg", LogisticRegression(max_iter=200, class_weight="balanced", C=C), {"C": C}))
+    for n_estimators in [100, 300]:
+        for max_depth in [None, 12]:
+            for min_samples_leaf in [1, 5]:
+                params = {"n_estimators": n_estimators, "max_depth": max_depth, "min_samples_leaf": min_samples_leaf}
+                space.append(("rf", RandomForestClassifier(random_state=random_state, class_weight="balanced_subsample", **params), params))
+    for learning_rate in [0.05, 0.1]:
+        for n_estimators in [100, 200]:
+            for max_depth in [2, 3]:
+                params = {"learning_rate": learning_rate, "n_estimators": n_estimators, "max_depth": max_depth}
+                space.append(("gb", GradientBoostingClassifier(random_state=random_state, **params), params))
+    return space
+
+def _candidate_id(family: str, params: Dict[str, Any]) -> str:
+    return family + "[" + ",".join(f"{k}={v}" for k, v in params.items()) + "]"
+
+# Trees added per step when a random forest is fitted interruptibly
+RF_CHUNK_TREES = 25
+# Share of a selection budget kept for the fallback fit, and the rows it fits and scores on
+FALLBACK_BUDGET_SHARE = 0.25
+FALLBACK_MAX_ROWS = 1000
+
+def _fit_pipeline(pipe: Pipeline, X, y, cancelled=None) -> bool:
+    """Fit `pipe`, checking `cancelled()` between boosting stages / tree chunks.
+
+    Returns False if the fit was abandoned. Forests are grown with
+    warm_start in chunks, which draws the same tree seeds as one fit.
+    """
+    clf = pipe.named_steps["clf"]
+    if cancelled is None or isinstance(clf, LogisticRegression):
+        pipe.fit(X, y)
+    elif isinstance(clf, GradientBoostingClassifier):
+        pipe.fit(X, y, clf__monitor=lambda i, est, locals_: cancelled())
+        # a monitor stop leaves fewer stages than asked for
+        return clf.n_estimators_ == clf.n_estimators
+    elif isinstance(clf, RandomForestClassifier):
+        Xt = pipe.named_steps["pre"].fit_transform(X, y)
+        n_estimators = clf.n_estimators
+        clf.set_params(warm_start=True)
+        for n in range(RF_CHUNK_TREES, n_estimators + RF_CHUNK_TREES, RF_CHUNK_TREES):
+            clf.set_params(n_estimators=min(n, n_estimators))
+            clf.fit(Xt, y)
+            if cancelled():
+                return False
+        clf.set_params(warm_start=False)
+    else:
+        pipe.fit(X, y)
+    return True
+
+def _fit_candidate(pre, model, X_train, y_train, X_test, y_test, cancelled=None):
+    pipe = Pipeline([("pre", clone(pre)), ("clf", clone(model))])
+    start = time.perf_counter()
+    if not _fit_pipeline(pipe, X_train, y_train, cancelled):
+        return None
+    fit_seconds = time.perf_counter() - start
+    acc = accuracy_score(y_test, pipe.predict(X_test))
+    return pipe, float(acc), fit_seconds
+
+# Worker pool for budgeted selection, kept across calls: spawning workers and
+# importing sklearn in them takes seconds, which small budgets cannot absorb.
+# Fits still running at a deadline are cancelled cooperatively through a
+# shared generation counter instead of terminating the pool: every call gets
+# a generation, and its tasks stop once _CANCEL reaches it.
+_POOL_LOCK = threading.Lock()
+_POOL: Optional[Tuple[Any, int]] = None  # (pool, processes)
+_CANCEL = None  # shared multiprocessing.Value: highest cancelled generation
+_GENERATION = 0
+# one selection at a time, so cancelling a generation never hits another call's fits
+_SELECTION_LOCK = threading.Lock()
+
+def _init_worker(cancel):
+    global _CANCEL
+    _CANCEL = cancel
+    import sklearn.compose, sklearn.ensemble, sklearn.linear_model  # noqa: F401
+
+def _ping() -> bool:
+    return True
+
+# The split of the running selection, written once per call and memory-mapped
+# by each worker on its first task, so tasks only carry a model and a row count.
+_SPLIT: Optional[Tuple[str, Dict[str, Any]]] = None  # (path, split) in a worker
+
+def _dump_split(**split) -> str:
+    fd, path = tempfile.mkstemp(prefix="churn-split-", suffix=".joblib")
+    os.close(fd)
+    joblib.dump(split, path)
+    return path
+
+def _load_split(path: str) -> Dict[str, Any]:
+    global _SPLIT
+    if _SPLIT is None or _SPLIT[0] != path:
+        _SPLIT = None  # drop the previous call's split before mapping the next
+        _SPLIT = (path, joblib.load(path, mmap_mode="r"))
+    return _SPLIT[1]
+
+def _fit_task(generation: int, split_path: str, model, n_samples: int):
+    def cancelled() -> bool:
+        return _CANCEL.value >= generation
+    if cancelled():
+        return None
+    split = _load_split(split_path)
+    # rung subsamples are prefixes of one fixed permutation of the training split
+    idx = split["order"][:n_samples]
+    return _fit_candidate(split["pre"], model, split["X_train"].iloc[idx], split["y_train"].iloc[idx],
+                          split["X_test"], split["y_test"], cancelled)
+
+def _selection_pool(processes: int):
+    """Shared spawn pool with `processes` workers; started if needed but not waited for."""
+    global _POOL, _CANCEL
+    with _POOL_LOCK:
+        ctx = multiprocessing.get_context("spawn")
+        if _CANCEL is None:
+            _CANCEL = ctx.Value("q", 0)
+        if _POOL is not None and _POOL[1] != processes:
+            _POOL[0].terminate()
+            _POOL = None
+        if _POOL is None:
+            _POOL = (ctx.Pool(processes=processes, initializer=_init_worker, initargs=(_CANCEL,)), processes)
+        return _POOL[0]
+
+def _next_generation() -> int:
+    global _GENERATION
+    with _POOL_LOCK:
+        _GENERATION += 1
+        return _GENERATION
+
+def _cancel_generation(generation: int):
+    with _CANCEL.get_lock():
+        _CANCEL.value = max(_CANCEL.value, generation)
+
+def shutdown_selection_pool():
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL[0].terminate()
+            _POOL = None
+
+def _fit_rung(pool, generation, split_path, candidates, n_samples: int, deadline: float):
+    """Fit candidates on the first `n_samples` rows of the split, waiting no longer than `deadline`.
+
+    Returns ({candidate index: (pipe, acc, fit_seconds)}, timed_out); failed
+    candidates are dropped. On timeout the caller cancels the generation.
+    """
+    pending = {i: pool.apply_async(_fit_task, (generation, split_path, model, n_samples))
+               for i, model in candidates}
+    results = {}
+    for i, res in pending.items():
+        try:
+            result = res.get(timeout=max(0.0, deadline - time.perf_counter()))
+        except multiprocessing.TimeoutError:
+            for j, other in pending.items():
+                if j not in results and other.ready() and other.successful() and other.get() is not None:
+                    results[j] = other.get()
+            return results, True
+        except Exception:
+            continue
+        if result is not None:
+            results[i] = result
+    return results, False
+
+def train_churn_budgeted(df: pd.DataFrame, budget_seconds: float, test_size: float = 0.2,
+                         random_state: int = 42, eta: int = 3, n_jobs: int = -1) -> Dict[str, Any]:
+    """Successive halving over _search_space() within a wall-clock budget.
+
+    Every surviving candidate is fitted in parallel on a growing nested
+    subsample of the training split and scored on the same holdout as
+    train_churn; the top 1/eta advance to a sample eta times larger. A rung
+    is skipped when its estimated cost (previous rung timings scaled by the
+    sample growth) does not fit in the remaining budget, and a rung that
+    overruns is cut at the deadline, keeping the candidates that finished.
+    Fits run in a shared spawned process pool (safe to start from server
+    threads) that stays warm across calls; fits cut at the deadline stop at
+    their next boosting stage or tree chunk. The budget is wall-clock from
+    the call: waiting for the pool counts against it, and the last
+    FALLBACK_BUDGET_SHARE is kept for the fallback. If no candidate finishes
+    in time, the cheapest one (the first logistic regression) is fitted
+    in-process on at most FALLBACK_MAX_ROWS rows of the smallest rung. The
+    best pipeline seen is persisted.
+    """
+    started = time.perf_counter()
+    deadline = started + budget_seconds * (1.0 - FALLBACK_BUDGET_SHARE)
+    pool = _selection_pool(effective_n_jobs(n_jobs))
+    X, y, features = _prepare_xy(df)
+    pre, _, _ = _build_preprocessor(X)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=random_state, stratify=y)
+
+    space = _search_space(random_state)
+    n_train = len(X_train)
+    n_rungs = max(1, int(math.floor(math.log(len(space), eta))) + 1)
+    min_samples = min(n_train, max(100, int(math.ceil(n_train / eta ** (n_rungs - 1)))))
+    # nested subsamples: rung r uses the first n_r rows of one fixed permutation
+    order = np.random.RandomState(random_state).permutation(n_train)
+
+    survivors = list(range(len(space)))
+    leaderboard: List[Dict[str, Any]] = []
+    rungs: List[Dict[str, Any]] = []
+    best = None  # (accuracy, n_samples, candidate index, pipe)
+    stopped_early = False
+    last_rung_cost, last_n, last_count = None, None, None
+
+    timed_out = False
+    generation = _next_generation()
+    pool_startup = 0.0
+    split_path = None
+    selecting = _SELECTION_LOCK.acquire(timeout=max(0.0, deadline - time.perf_counter()))
+    try:
+        if selecting:
+            split_path = _dump_split(pre=pre, X_train=X_train, y_train=y_train, X_test=X_test, y_test=y_test, order=order)
+            # a cold pool is still importing sklearn; give up on it (not on the call) at the deadline
+            wait_start = time.perf_counter()
+            try:
+                pool.apply_async(_ping).get(timeout=max(0.0, deadline - wait_start))
+            except multiprocessing.TimeoutError:
+                stopped_early = True
+            pool_startup = time.perf_counter() - wait_start
+        for rung in range(n_rungs if selecting and not stopped_early else 0):
+            n_samples = n_train if rung == n_rungs - 1 else min(n_train, min_samples * eta ** rung)
+            remaining = deadline - time.perf_counter()
+            if last_rung_cost is not None:
+                estimate = last_rung_cost * (n_samples / last_n) * (len(survivors) / max(1, last_count))
+                if estimate > remaining:
+                    stopped_early = True
+                    break
+            if remaining <= 0:
+                stopped_early = True
+                break
+
+            if y_train.iloc[order[:n_samples]].nunique() < 2:
+                continue
+            rung_start = time.perf_counter()
+            results, timed_out = _fit_rung(pool, generation, split_path, [(i, space[i][1]) for i in survivors],
+                                           n_samples, deadline)
+            rung_seconds = time.perf_counter() - rung_start
+
+            ranked = []
+            for i, (pipe, acc, fit_seconds) in results.items():
+                family, _, params = space[i]
+                leaderboard.append({
+                    "candidate": _candidate_id(family, params),
+                    "model": family,
+                    "params": params,
+                    "rung": rung,
+                    "n_samples": int(n_samples),
+                    "accuracy": round(acc * 100.0, 2),
+                    "fit_seconds": round(fit_seconds, 4),
+                })
+                ranked.append((acc, i, pipe))
+                if best is None or (n_samples, acc) > (best[1], best[0]):
+                    best = (acc, n_samples, i, pipe)
+            rungs.append({"rung": rung, "n_samples": int(n_samples), "candidates": len(survivors),
+                          "finished": len(results), "seconds": round(rung_seconds, 4)})
+            if timed_out:
+                stopped_early = True
+                break
+
+            last_rung_cost, last_n, last_count = rung_seconds, n_samples, len(survivors)
+            ranked.sort(key=lambda t: t[0], reverse=True)
+            survivors = [i for _, i, _ in ranked[:max(1, len(ranked) // eta)]]
+            if len(ranked) <= 1:
+                break
+    finally:
+        # never leave abandoned fits running on the shared pool
+        _cancel_generation(generation)
+        if split_path is not None:
+            # workers that still map it keep their pages; the name goes now
+            os.unlink(split_path)
+        if selecting:
+            _SELECTION_LOCK.release()
+    stopped_early = stopped_early or not selecting
+
+    fallback = best is None
+    if fallback:
+        # capped so the fit stays within the reserved share of the budget
+        idx = order[:min(min_samples, FALLBACK_MAX_ROWS)]
+        if y_train.iloc[idx].nunique() < 2:
+            y_order = y_train.to_numpy()[order]
+            idx = np.unique(np.concatenate([idx, [order[np.argmax(y_order == c)] for c in y_train.unique()]]))
+        X_sub, y_sub = X_train.iloc[idx], y_train.iloc[idx]
+        pipe, acc, fit_seconds = _fit_candidate(pre, space[0][1], X_sub, y_sub,
+                                                X_test.head(FALLBACK_MAX_ROWS), y_test.head(FALLBACK_MAX_ROWS))
+        family, _, params = space[0]
+        leaderboard.append({"candidate": _candidate_id(family, params), "model": family, "params": params,
+                            "rung": -1, "n_samples": int(len(X_sub)), "accuracy": round(acc * 100.0, 2),
+                            "fit_seconds": round(fit_seconds, 4)})
+        best = (acc, len(X_sub), 0, pipe)
+
+    best_acc, best_n, best_i, best_pipe = best
+    family, _, params = space[best_i]
+    STORE.save_churn_artifacts(best_pipe.named_steps["pre"], best_pipe.named_steps["clf"], features)
+    export_scorer(best_pipe.named_steps["pre"], best_pipe.named_steps["clf"], X_test.head(PARITY_SAMPLE_ROWS))
+
+    leaderboard.sort(key=lambda r: (r["rung"], r["accuracy"]), reverse=True)
+    # latest (largest-sample) accuracy per candidate
+    scores: Dict[str, float] = {}
+    for row in leaderboard:
+        scores.setdefault(row["candidate"], row["accuracy"])
+    return {
+        "scores": scores,
+        "best_model": _candidate_id(family, params),
+        "best_accuracy": round(best_acc * 100.0, 2),
+        "best_n_samples": int(best_n),
+        "leaderboard": leaderboard,
+        "timings": {
+            "budget_seconds": budget_seconds,
+            "elapsed_seconds": round(time.perf_counter() - started, 4),
+            "stopped_early": stopped_early,
+            "fallback": fallback,
+            "pool_startup_seconds": round(pool_startup, 4),
+            "rungs": rungs,
+        },
+    }
+
 def churn_proba(df_records: pd.DataFrame) -> np.ndarray:
     pre, model, features = STORE.load_churn_artifacts()
     if pre is None or model is None:
@@ -105,13 +437,16 @@ def churn_proba(df_records: pd.DataFrame) -> np.ndarray:
     for f in features:
         if f not in df_records.columns:
             df_records[f] = np.nan
-    X = df_records[features]
+    X = expand_for_sklearn(df_records[features])
     # Build a new pipeline just for transform+predict
     from sklearn.pipeline import Pipeline
     pipe = Pipeline([("pre", pre), ("clf", model)])
     proba = pipe.predict_proba(X)[:, 1]
     return proba
 
+def churn_proba_records(records: List[Dict[str, Any]]) -> np.ndarray:
+    return churn_proba(pd.DataFrame(records))
+
 def segments_from_proba(p: np.ndarray) -> List[str]:
     seg = []
     for val in p:
@@ -144,36 +479,86 @@ def churn_segments_summary(df: pd.DataFrame) -> Dict[str, int]:
     from collections import Counter
     return dict(Counter(segs))
 
-def churn_rate_trend(df: pd.DataFrame) -> tuple[list[str], list[float]]:
-    churn_col = find_churn_col(df)
-    if churn_col is None:
-        raise ValueError("Churn target column not found for trends.")
-    # build a period column if date exists
+def _trend_periods(df: pd.DataFrame) -> Optional[pd.Series]:
+    # monthly period per row from the first date-like column; None without usable dates
     date_col = None
     for c in df.columns:
         if "date" in c.lower() or "time" in c.lower():
             date_col = c
             break
-    if date_col and not pd.api.types.is_datetime64_any_dtype(df[date_col]):
-        df[date_col] = pd.to_datetime(df[date_col], errors="coerce")
-    if date_col is None or df[date_col].isna().all():
+    if date_col is None:
+        return None
+    dates = df[date_col]
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = to_datetime_series(dates)
+    if dates.isna().all():
+        return None
+    return dates.dt.to_period("M").astype(str)
+
+def churn_rate_trend(df: pd.DataFrame) -> tuple[list[str], list[float]]:
+    churn_col = find_churn_col(df)
+    if churn_col is None:
+        raise ValueError("Churn target column not found for trends.")
+    from .common import to_bool_series
+    yb = to_bool_series(df[churn_col])
+    periods = _trend_periods(df)
+    if periods is None:
         # No dates; return overall churn rate only
-        y = df[churn_col]
-        from .common import to_bool_series
-        yb = to_bool_series(y)
         rate = float(yb.mean())
         return ["overall"], [round(rate * 100.0, 2)]
     # With dates: monthly churn rate
-    df["_ym"] = df[date_col].dt.to_period("M").astype(str)
-    from .common import to_bool_series
-    yb = to_bool_series(df[churn_col])
-    grp = df.groupby("_ym")
-    periods = []
+    out_periods = []
     rates = []
-    for k, g in grp:
-        yb_g = to_bool_series(g[churn_col])
+    for k, yb_g in yb.groupby(periods):
         if len(yb_g) == 0:
             continue
-        periods.append(k)
+        out_periods.append(k)
         rates.append(round(float(yb_g.mean()) * 100.0, 2))
-    return periods, rates
+    return out_periods, rates
+
+# --- Approximate analytics over stratified samples (see services.sampling) ---
+
+OVERALL_STRATUM = "overall"
+NO_PERIOD_STRATUM = "_no_period"
+
+def churn_sample_strata(df: pd.DataFrame) -> Tuple[pd.Series, Dict[str, Any]]:
+    """Strata for churn samples: the trend's monthly periods, so every period keeps rows."""
+    periods = _trend_periods(df)
+    if periods is None:
+        return pd.Series(OVERALL_STRATUM, index=df.index), {}
+    return periods.fillna(NO_PERIOD_STRATUM), {}
+
+def churn_segments_approx(sample: StratifiedSample, sample_size: Optional[int] = None,
+                          confidence: float = 0.95) -> Tuple[Dict[str, int], Dict[str, List[float]], int]:
+    """Segment counts over the full frame estimated by scoring only sampled rows.
+
+    Returns (estimated counts, CI bounds per segment, rows scored).
+    """
+    rows = sample.take(sample_size)
+    segs = pd.Series(segments_from_proba(churn_proba(rows.copy())), index=rows.index)
+    counts, intervals = {}, {}
+    for seg in segs.unique():
+        total, half = stratified_total((segs == seg).to_numpy(dtype=float), rows[STRATUM_COL], sample.populations, confidence)
+        counts[seg] = int(round(total))
+        intervals[seg] = [max(0.0, round(total - half, 2)), min(float(sample.population_rows), round(total + half, 2))]
+    return counts, intervals, len(rows)
+
+def churn_rate_trend_approx(sample: StratifiedSample, sample_size: Optional[int] = None,
+                            confidence: float = 0.95) -> Tuple[List[str], List[float], List[List[float]], int]:
+    """Monthly churn rate (in %) per stratum of a churn sample, with CI bounds."""
+    from .common import to_bool_series
+    rows = sample.take(sample_size)
+    churn_col = find_churn_col(rows.drop(columns=[STRATUM_COL, PRIORITY_COL, WEIGHT_COL]))
+    if churn_col is None:
+        raise ValueError("Churn target column not found for trends.")
+    yb = to_bool_series(rows[churn_col])
+    periods, rates, intervals = [], [], []
+    for k, yb_g in yb.groupby(rows[STRATUM_COL]):
+        if k == NO_PERIOD_STRATUM or len(yb_g) == 0:
+            continue
+        p = float(yb_g.mean())
+        lo, hi = proportion_interval(p, int(yb_g.count()), sample.populations[k], confidence) if not math.isnan(p) else (p, p)
+        periods.append(k)
+        rates.append(round(p * 100.0, 2))
+        intervals.append([round(lo * 100.0, 2), round(hi * 100.0, 2)])
+    return periods, rates, intervals, len(rows)
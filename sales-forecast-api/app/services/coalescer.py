@@ -0,0 +1,118 @@
+from __future__ import annotations
+import asyncio
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+import numpy as np
+from .executor import EXECUTOR, PoolSaturated
+
+
+def _bucket(n: int) -> int:
+    # power-of-two histogram buckets: 1, 2, 4, 8, ...
+    return 1 << max(0, (n - 1).bit_length())
+
+
+class InferenceCoalescer:
+    """Collects concurrent scoring requests and scores them as one batch.
+
+    The first request to arrive opens a window of `max_wait_ms`; the batch is
+    flushed when the window closes or as soon as `max_batch_rows` rows are
+    pending. `score_fn` receives the concatenated records and must return one
+    probability per record, which is split back to the callers in order.
+    If a batch fails it is split in half and each half rescored, recursively,
+    so one malformed request fails alone at the cost of ~2*log2(requests)
+    extra calls rather than one call per request.
+    """
+
+    def __init__(self, score_fn: Callable[[List[Dict[str, Any]]], np.ndarray],
+                 max_batch_rows: int = 512, max_wait_ms: float = 2.0, pool: str = "inference"):
+        self.score_fn = score_fn
+        self.max_batch_rows = max(1, int(max_batch_rows))
+        self.max_wait_ms = max(0.0, float(max_wait_ms))
+        self.pool = pool
+        self._pending: List[Tuple[List[Dict[str, Any]], asyncio.Future, float]] = []
+        self._pending_rows = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        # metrics
+        self.batches = 0
+        self.requests = 0
+        self.rows = 0
+        self.bisections = 0
+        self.total_wait_seconds = 0.0
+        self.rows_histogram: Counter = Counter()
+        self.requests_histogram: Counter = Counter()
+
+    async def submit(self, records: List[Dict[str, Any]]) -> np.ndarray:
+        if not records:
+            return np.empty(0)
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((records, fut, time.perf_counter()))
+        self._pending_rows += len(records)
+        if self._pending_rows >= self.max_batch_rows:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000.0, self._flush)
+        return await fut
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._pending_rows = self._pending, [], 0
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[List[Dict[str, Any]], asyncio.Future, float]]):
+        now = time.perf_counter()
+        n_rows = sum(len(recs) for recs, _, _ in batch)
+        self.batches += 1
+        self.requests += len(batch)
+        self.rows += n_rows
+        self.total_wait_seconds += sum(now - t for _, _, t in batch)
+        self.rows_histogram[_bucket(n_rows)] += 1
+        self.requests_histogram[_bucket(len(batch))] += 1
+        await self._score(batch)
+
+    async def _score(self, batch: List[Tuple[List[Dict[str, Any]], asyncio.Future, float]]):
+        records = [r for recs, _, _ in batch for r in recs]
+        try:
+            proba = await EXECUTOR.run(self.pool, self.score_fn, records)
+        except PoolSaturated as e:
+            for _, fut, _ in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        except Exception as e:
+            if len(batch) == 1:
+                if not batch[0][1].done():
+                    batch[0][1].set_exception(e)
+            else:
+                self.bisections += 1
+                mid = len(batch) // 2
+                await asyncio.gather(self._score(batch[:mid]), self._score(batch[mid:]))
+            return
+
+        offset = 0
+        for recs, fut, _ in batch:
+            if not fut.done():
+                fut.set_result(proba[offset:offset + len(recs)])
+            offset += len(recs)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch_rows": self.max_batch_rows,
+            "max_wait_ms": self.max_wait_ms,
+            "batches": self.batches,
+            "requests": self.requests,
+            "rows": self.rows,
+            "bisections": self.bisections,
+            "avg_batch_rows": round(self.rows / self.batches, 2) if self.batches else 0.0,
+            "avg_wait_ms": round(self.total_wait_seconds / self.requests * 1000.0, 3) if self.requests else 0.0,
+            "batch_rows_histogram": {str(k): v for k, v in sorted(self.rows_histogram.items())},
+            "batch_requests_histogram": {str(k): v for k, v in sorted(self.requests_histogram.items())},
+        }
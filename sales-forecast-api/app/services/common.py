@@ -1,7 +1,7 @@
 from __future__ import annotations
 import pandas as pd
 import numpy as np
-from typing import Optional, Tuple, List
+from typing import Optional, Tuple, List, Dict, Any
 import re
 from dataclasses import dataclass, field
 from joblib import dump, load
@@ -46,8 +46,19 @@ def find_product_col(df: pd.DataFrame) -> Optional[str]:
 def find_churn_col(df: pd.DataFrame) -> Optional[str]:
     return find_col(df, ["churn","is_churn","churned","exited","attrited","churn_flag"])
 
+def to_datetime_series(s: pd.Series) -> pd.Series:
+    # pd.to_datetime keeps the categorical dtype of compacted columns, so parse the categories instead
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        cats = pd.DatetimeIndex(pd.to_datetime(pd.Series(s.cat.categories), errors="coerce"))
+        values = cats.take(s.cat.codes.to_numpy(), allow_fill=True, fill_value=pd.NaT)
+        return pd.Series(values, index=s.index, name=s.name)
+    return pd.to_datetime(s, errors="coerce")
+
 def to_bool_series(s: pd.Series) -> pd.Series:
     # normalize common labels to 0/1
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        # mapping a categorical keeps it categorical, which breaks .mean() downstream
+        s = s.astype(object)
     mapping = {
         "yes":1, "y":1, "true":1, "t":1, 1:1, "1":1, "churn":1, "exited":1, "left":1,
         "no":0, "n":0, "false":0, "f":0, 0:0, "0":0, "stay":0
@@ -59,14 +70,22 @@ class Store:
     df_raw: Optional[pd.DataFrame] = None
     df_sales: Optional[pd.DataFrame] = None
     df_customers: Optional[pd.DataFrame] = None
+    # dtype compaction reports keyed by frame name (see services.compaction)
+    memory_reports: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    # content key of the loaded data (see services.ingest); None when unknown
+    data_hash: Optional[str] = None
+    # stratified samples of the loaded frames keyed by use ("churn", "sales"), see services.sampling
+    samples: Dict[str, Any] = field(default_factory=dict)
 
     # churn
     churn_preprocessor_path: Path = field(default=Path("app/models/churn_preprocessor.joblib"))
     churn_model_path: Path = field(default=Path("app/models/churn_model.joblib"))
     churn_features_path: Path = field(default=Path("app/models/churn_features.json"))
+    churn_scorer_path: Path = field(default=Path("app/models/churn_scorer.joblib"))
 
     # sales
     sales_cache_path: Path = field(default=Path("app/models/sales_cache.parquet"))
+    forecast_state_path: Path = field(default=Path("app/models/forecast_state.json"))
 
     def save_churn_artifacts(self, preprocessor, model, features: List[str]):
         dump(preprocessor, self.churn_preprocessor_path)
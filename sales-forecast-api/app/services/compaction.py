@@ -0,0 +1,110 @@
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import pyarrow  # noqa: F401  (enables the "string[pyarrow]" dtype)
+    ARROW_STRING = "string[pyarrow]"
+except ImportError:  # optional: high-cardinality strings stay as object
+    ARROW_STRING = None
+
+
+def _is_plain_string(s: pd.Series) -> bool:
+    if isinstance(s.dtype, pd.StringDtype):
+        return True
+    if s.dtype != object:
+        return False
+    sample = s.dropna()
+    if sample.empty:
+        return False
+    sample = sample.iloc[:1000]
+    return bool(sample.map(lambda v: isinstance(v, str)).all())
+
+
+def _lossless_float32(s: pd.Series) -> bool:
+    v = s.to_numpy()
+    with np.errstate(over="ignore", invalid="ignore"):
+        back = v.astype(np.float32).astype(np.float64)
+    return bool(np.array_equal(back, v, equal_nan=True))
+
+
+def compact_frame(
+    df: pd.DataFrame,
+    max_category_ratio: float = 0.5,
+    max_categories: int = 5000,
+    downcast_floats: bool = False,
+    arrow_strings: bool = True,
+    exclude: Optional[List[str]] = None,
+) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """Shrink a frame's dtypes without changing its values.
+
+    - object string columns with few distinct values become `category`
+    - other object string columns become Arrow-backed strings (when pyarrow
+      is installed); pandas string dtypes are left as they are
+    - integers are downcast to the smallest type holding their range
+    - floats are downcast to float32 only when `downcast_floats` is set and
+      every value round-trips exactly; off by default because pandas sums and
+      means on float32 accumulate in float32 and would shift aggregate outputs
+
+    Returns the compacted frame and a per-column memory report.
+    """
+    exclude = set(exclude or [])
+    out = df.copy(deep=False)
+    columns: Dict[str, Dict[str, Any]] = {}
+    n = len(out)
+
+    for c in out.columns:
+        s = out[c]
+        before = int(s.memory_usage(deep=True, index=False))
+        new = s
+        if c not in exclude:
+            if pd.api.types.is_bool_dtype(s):
+                pass
+            elif pd.api.types.is_integer_dtype(s) and not pd.api.types.is_extension_array_dtype(s):
+                new = pd.to_numeric(s, downcast="integer")
+            elif pd.api.types.is_float_dtype(s) and downcast_floats and _lossless_float32(s):
+                new = s.astype(np.float32)
+            elif _is_plain_string(s):
+                nunique = s.nunique(dropna=True)
+                if n and nunique <= max_categories and nunique / n <= max_category_ratio:
+                    new = s.astype("category")
+                elif arrow_strings and ARROW_STRING is not None and s.dtype == object:
+                    new = s.astype(ARROW_STRING)
+        if new is not s:
+            out[c] = new
+        columns[str(c)] = {
+            "dtype_before": str(s.dtype),
+            "dtype_after": str(new.dtype),
+            "bytes_before": before,
+            "bytes_after": int(new.memory_usage(deep=True, index=False)) if new is not s else before,
+        }
+
+    total_before = sum(v["bytes_before"] for v in columns.values())
+    total_after = sum(v["bytes_after"] for v in columns.values())
+    report = {
+        "rows": n,
+        "bytes_before": total_before,
+        "bytes_after": total_after,
+        "saved_pct": round((1 - total_after / total_before) * 100.0, 2) if total_before else 0.0,
+        "columns": columns,
+    }
+    return out, report
+
+
+def expand_for_sklearn(X: pd.DataFrame) -> pd.DataFrame:
+    """Undo categorical/Arrow string dtypes so sklearn sees the original object values.
+
+    Extension string dtypes use pd.NA for missing values, which SimpleImputer
+    does not treat as missing; converting back keeps fitted models and
+    probabilities identical to an uncompacted frame.
+    """
+    cols = [c for c in X.columns
+            if isinstance(X[c].dtype, pd.CategoricalDtype)
+            or (pd.api.types.is_string_dtype(X[c].dtype) and X[c].dtype != object)]
+    if not cols:
+        return X
+    X = X.copy(deep=False)
+    for c in cols:
+        X[c] = X[c].astype(object).where(X[c].notna(), np.nan)
+    return X
@@ -0,0 +1,253 @@
+from __future__ import annotations
+import base64
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from ..config import settings
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib encoder
+    orjson = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # optional: only needed for format=arrow
+    pa = None
+
+MAX_PAGE_SIZE = 10_000
+MAX_CACHED_ORDERS = 8
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+_FILTER_OPS = {"eq", "ne", "gt", "gte", "lt", "lte", "in", "contains"}
+
+
+class QueryError(ValueError):
+    """Invalid projection, filter, sort or cursor in a records query."""
+
+
+@dataclass
+class Dataset:
+    dataset_id: str
+    df: pd.DataFrame
+    summary: Dict[str, Any]
+    created_at: float = field(default_factory=time.time)
+    # row orders for recent (filter, sort) combinations, so paging does not re-sort
+    _orders: "OrderedDict[str, np.ndarray]" = field(default_factory=OrderedDict, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+
+class DatasetRegistry:
+    """Processed frames addressable by a dataset handle, oldest evicted first."""
+
+    def __init__(self, max_datasets: int = 4):
+        self.max_datasets = max_datasets
+        self._items: "OrderedDict[str, Dataset]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, df: pd.DataFrame, dataset_id: Optional[str] = None,
+                 summary: Optional[Dict[str, Any]] = None) -> Dataset:
+        ds = Dataset(dataset_id=dataset_id or uuid.uuid4().hex, df=df,
+                     summary=summary if summary is not None else summarize(df))
+        with self._lock:
+            self._items[ds.dataset_id] = ds
+            self._items.move_to_end(ds.dataset_id)
+            while len(self._items) > self.max_datasets:
+                self._items.popitem(last=False)
+        return ds
+
+    def get(self, dataset_id: str) -> Optional[Dataset]:
+        with self._lock:
+            return self._items.get(dataset_id)
+
+    def ids(self) -> List[str]:
+        with self._lock:
+            return list(self._items.keys())
+
+
+DATASETS = DatasetRegistry(max_datasets=settings.max_datasets)
+
+
+def _native(v: Any) -> Any:
+    if isinstance(v, (np.integer,)):
+        return int(v)
+    if isinstance(v, (np.floating,)):
+        return None if np.isnan(v) else float(v)
+    if isinstance(v, (np.bool_,)):
+        return bool(v)
+    return v
+
+
+def summarize(df: pd.DataFrame, max_levels: int = 20) -> Dict[str, Any]:
+    numeric = {}
+    categorical = {}
+    for c in df.columns:
+        s = df[c]
+        if pd.api.types.is_bool_dtype(s):
+            categorical[c] = {str(k): int(v) for k, v in s.value_counts(dropna=False).items()}
+        elif pd.api.types.is_numeric_dtype(s):
+            numeric[c] = {
+                "count": int(s.count()),
+                "mean": _native(s.mean()),
+                "min": _native(s.min()),
+                "max": _native(s.max()),
+            }
+        else:
+            counts = s.value_counts(dropna=False)
+            counts = counts[counts > 0]  # categoricals also list unused levels
+            if len(counts) <= max_levels:
+                categorical[c] = {str(k): int(v) for k, v in counts.items()}
+    return {
+        "rows": int(len(df)),
+        "columns": [str(c) for c in df.columns],
+        "numeric": numeric,
+        "categorical": categorical,
+    }
+
+
+def _parse_filter(df: pd.DataFrame, expr: str) -> pd.Series:
+    parts = expr.split(":", 2)
+    if len(parts) != 3:
+        raise QueryError(f"Bad filter '{expr}'. Expected column:op:value.")
+    col, op, raw = parts
+    if col not in df.columns:
+        raise QueryError(f"Unknown filter column: {col}")
+    if op not in _FILTER_OPS:
+        raise QueryError(f"Unknown filter op '{op}'. Use one of: {', '.join(sorted(_FILTER_OPS))}")
+    s = df[col]
+
+    def coerce(v: str):
+        if pd.api.types.is_bool_dtype(s):
+            return v.strip().lower() in {"1", "true", "yes"}
+        if pd.api.types.is_numeric_dtype(s):
+            try:
+                return float(v)
+            except ValueError:
+                raise QueryError(f"Filter value '{v}' is not numeric for column {col}")
+        return v
+
+    if op == "in":
+        return s.isin([coerce(v) for v in raw.split("|")])
+    if op == "contains":
+        return s.astype(str).str.contains(raw, case=False, regex=False, na=False)
+    val = coerce(raw)
+    if op == "eq":
+        return s == val
+    if op == "ne":
+        return s != val
+    if pd.api.types.is_bool_dtype(s):
+        raise QueryError(f"Operator '{op}' is not supported for column {col}")
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        s = s.astype(str)
+    return {"gt": s > val, "gte": s >= val, "lt": s < val, "lte": s <= val}[op]
+
+
+def _order_key(dataset_id: str, filters: List[str], sort: Optional[str], descending: bool) -> str:
+    payload = json.dumps([dataset_id, sorted(filters), sort, descending])
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _row_order(ds: Dataset, filters: List[str], sort: Optional[str], descending: bool, key: str) -> np.ndarray:
+    with ds._lock:
+        cached = ds._orders.get(key)
+        if cached is not None:
+            ds._orders.move_to_end(key)
+            return cached
+    df = ds.df
+    if sort is not None and sort not in df.columns:
+        raise QueryError(f"Unknown sort column: {sort}")
+    mask = np.ones(len(df), dtype=bool)
+    for expr in filters:
+        mask &= _parse_filter(df, expr).to_numpy(dtype=bool, na_value=False)
+    positions = np.flatnonzero(mask)
+    if sort is not None:
+        col = df[sort].iloc[positions]
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            col = col.astype(str)
+        # stable sort keeps ties in upload order across pages
+        order = col.reset_index(drop=True).sort_values(ascending=not descending, kind="stable", na_position="last").index.to_numpy()
+        positions = positions[order]
+    with ds._lock:
+        ds._orders[key] = positions
+        while len(ds._orders) > MAX_CACHED_ORDERS:
+            ds._orders.popitem(last=False)
+    return positions
+
+
+def encode_cursor(offset: int, key: str) -> str:
+    raw = json.dumps({"o": offset, "k": key}).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, key: str) -> int:
+    try:
+        pad = "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(cursor + pad))
+        offset, cursor_key = int(data["o"]), data["k"]
+    except Exception:
+        raise QueryError("Malformed cursor.")
+    if cursor_key != key:
+        raise QueryError("Cursor does not match this dataset/filter/sort combination.")
+    return offset
+
+
+def query_page(
+    ds: Dataset,
+    columns: Optional[List[str]] = None,
+    filters: Optional[List[str]] = None,
+    sort: Optional[str] = None,
+    descending: bool = False,
+    limit: int = 500,
+    cursor: Optional[str] = None,
+) -> Tuple[pd.DataFrame, Optional[str], int]:
+    """Return (page, next_cursor, total_matching) for a filtered/sorted/projected view."""
+    filters = filters or []
+    if columns:
+        unknown = [c for c in columns if c not in ds.df.columns]
+        if unknown:
+            raise QueryError(f"Unknown columns: {', '.join(unknown)}")
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    key = _order_key(ds.dataset_id, filters, sort, descending)
+    positions = _row_order(ds, filters, sort, descending, key)
+    offset = decode_cursor(cursor, key) if cursor else 0
+    window = positions[offset:offset + limit]
+    page = ds.df.iloc[window]
+    if columns:
+        page = page[columns]
+    end = offset + len(window)
+    next_cursor = encode_cursor(end, key) if end < len(positions) else None
+    return page, next_cursor, int(len(positions))
+
+
+def _json_default(v: Any):
+    if isinstance(v, (pd.Timestamp, np.datetime64)):
+        return str(v)
+    if isinstance(v, np.generic):
+        return _native(v)
+    return str(v)
+
+
+def page_to_json(page: pd.DataFrame, meta: Dict[str, Any]) -> bytes:
+    # replace NaN with None so both encoders emit null
+    records = page.astype(object).where(page.notna(), None).to_dict(orient="records")
+    body = {**meta, "data": records}
+    if orjson is not None:
+        return orjson.dumps(body, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(body, default=_json_default).encode("utf-8")
+
+
+def page_to_arrow(page: pd.DataFrame, meta: Dict[str, Any]) -> bytes:
+    if pa is None:
+        raise QueryError("format=arrow requires pyarrow to be installed.")
+    table = pa.Table.from_pandas(page, preserve_index=False)
+    table = table.replace_schema_metadata({"meta": json.dumps(meta, default=_json_default)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
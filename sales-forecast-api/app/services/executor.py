@@ -0,0 +1,175 @@
+from __future__ import annotations
+import asyncio
+import concurrent.futures
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+from ..config import settings
+
+
+class PoolSaturated(Exception):
+    """Raised when a compute pool cannot admit more work.
+
+    `status_code` is 429 when the pool queue is full and 503 when the pool
+    is shut down; `retry_after` is the suggested back-off in seconds.
+    """
+
+    def __init__(self, pool: str, status_code: int, retry_after: int, detail: str):
+        super().__init__(detail)
+        self.pool = pool
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.detail = detail
+
+
+@dataclass
+class ComputePool:
+    """Bounded thread pool with admission control.
+
+    At most `max_workers` tasks run at once and at most `queue_limit` more
+    wait for a worker; anything beyond that is rejected immediately instead
+    of piling up behind the event loop.
+    """
+    name: str
+    max_workers: int
+    queue_limit: int
+    retry_after: int = 1
+
+    running: int = 0
+    queued: int = 0
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    rejected: int = 0
+    cancelled: int = 0
+    max_queue_depth: int = 0
+    total_run_seconds: float = 0.0
+    total_wait_seconds: float = 0.0
+
+    _executor: Optional[ThreadPoolExecutor] = field(default=None, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    _closed: bool = field(default=False, repr=False)
+
+    def __post_init__(self):
+        self.max_workers = max(1, int(self.max_workers))
+        self.queue_limit = max(0, int(self.queue_limit))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"compute-{self.name}")
+
+    def _estimate_retry_after(self) -> int:
+        # expected time until a queue slot frees up, based on observed task durations
+        if self.completed == 0:
+            return self.retry_after
+        avg = self.total_run_seconds / self.completed
+        waves = (self.queued + 1) / self.max_workers
+        return max(self.retry_after, int(math.ceil(avg * waves)))
+
+    def _admit(self):
+        with self._lock:
+            if self._closed:
+                self.rejected += 1
+                raise PoolSaturated(self.name, 503, self.retry_after, f"Compute pool '{self.name}' is shutting down.")
+            if self.running + self.queued >= self.max_workers + self.queue_limit:
+                self.rejected += 1
+                raise PoolSaturated(self.name, 429, self._estimate_retry_after(),
+                                    f"Compute pool '{self.name}' is saturated; retry later.")
+            self.queued += 1
+            self.submitted += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queued)
+
+    def _call(self, fn: Callable[..., Any], args, kwargs, enqueued_at: float):
+        started = time.perf_counter()
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            self.total_wait_seconds += started - enqueued_at
+        ok = False
+        try:
+            result = fn(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.total_run_seconds += time.perf_counter() - started
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+    def _release_if_cancelled(self, fut: concurrent.futures.Future):
+        # a task cancelled while still queued never reaches _call, so free its slot here
+        if fut.cancelled():
+            with self._lock:
+                self.queued -= 1
+                self.cancelled += 1
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        self._admit()
+        try:
+            fut = self._executor.submit(self._call, fn, args, kwargs, time.perf_counter())
+        except RuntimeError:
+            # executor was shut down between admission and submission
+            with self._lock:
+                self.queued -= 1
+            raise PoolSaturated(self.name, 503, self.retry_after, f"Compute pool '{self.name}' is shutting down.")
+        fut.add_done_callback(self._release_if_cancelled)
+        # cancelling the awaiting task cancels `fut` too if it has not started yet
+        return await asyncio.wrap_future(fut)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            finished = self.completed + self.failed
+            return {
+                "max_workers": self.max_workers,
+                "queue_limit": self.queue_limit,
+                "running": self.running,
+                "queue_depth": self.queued,
+                "max_queue_depth": self.max_queue_depth,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "cancelled": self.cancelled,
+                "avg_run_ms": round(self.total_run_seconds / finished * 1000.0, 2) if finished else 0.0,
+                "avg_wait_ms": round(self.total_wait_seconds / finished * 1000.0, 2) if finished else 0.0,
+            }
+
+    def shutdown(self, wait: bool = False):
+        with self._lock:
+            self._closed = True
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+class ComputeExecutor:
+    """Registry of the named compute pools (inference, forecasting, training)."""
+
+    def __init__(self):
+        self.pools: Dict[str, ComputePool] = {
+            "inference": ComputePool("inference", settings.inference_workers,
+                                     settings.inference_queue_limit, settings.compute_retry_after),
+            "forecasting": ComputePool("forecasting", settings.forecasting_workers,
+                                       settings.forecasting_queue_limit, settings.compute_retry_after),
+            "training": ComputePool("training", settings.training_workers,
+                                    settings.training_queue_limit, settings.compute_retry_after),
+        }
+
+    def pool(self, name: str) -> ComputePool:
+        if name not in self.pools:
+            raise KeyError(f"Unknown compute pool: {name}")
+        return self.pools[name]
+
+    async def run(self, pool: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        return await self.pool(pool).run(fn, *args, **kwargs)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: p.stats() for name, p in self.pools.items()}
+
+    def shutdown(self, wait: bool = False):
+        for p in self.pools.values():
+            p.shutdown(wait=wait)
+
+
+EXECUTOR = ComputeExecutor()
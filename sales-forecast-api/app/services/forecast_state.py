@@ -0,0 +1,175 @@
+from __future__ import annotations
+import hashlib
+import json
+import threading
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional
+import numpy as np
+import pandas as pd
+from ..model import preprocess_data, forecast_product, STATIC_COLUMNS, HISTORY_WINDOW
+from .common import STORE
+
+
+@dataclass
+class ProductState:
+    """Everything the recursive forecaster needs for one product."""
+    product_id: Any
+    last_date: str
+    window: List[float]  # last HISTORY_WINDOW sales values, oldest first
+    max_sales: float
+    static: Dict[str, float] = field(default_factory=dict)
+    rows_seen: int = 0
+    # keys of the rows already folded in for last_date, so a re-sent delta is not appended twice
+    last_day_keys: List[str] = field(default_factory=list)
+
+    def append(self, date: pd.Timestamp, sales: float, static: Dict[str, float], key: str):
+        if date.isoformat() != self.last_date:
+            self.last_day_keys = []
+        self.last_day_keys.append(key)
+        self.window.append(float(sales))
+        if len(self.window) > HISTORY_WINDOW:
+            del self.window[:-HISTORY_WINDOW]
+        self.max_sales = max(self.max_sales, float(sales))
+        self.static = static
+        self.last_date = date.isoformat()
+        self.rows_seen += 1
+
+
+def _static_from_row(row: Mapping[str, Any], columns: List[str]) -> Dict[str, float]:
+    # mirrors feature_engineering's fillna(0) on the last row
+    out = {}
+    for col in columns:
+        v = row[col]
+        out[col] = 0 if pd.isna(v) else (v.item() if isinstance(v, np.generic) else v)
+    return out
+
+
+def _row_key(row: Mapping[str, Any], static_cols: List[str]) -> str:
+    # order_id identifies a row; without one, identical rows on the same day count as one
+    order_id = row.get("order_id")
+    if order_id is not None and not pd.isna(order_id):
+        return str(order_id)
+    parts = [row["product_id"], row["last_purchase_date"].isoformat(), float(row["sales"])]
+    for c in static_cols:
+        v = row[c]
+        # normalise numeric types: the same value may load as int in one file and float in another
+        parts.append(None if pd.isna(v) else float(v) if isinstance(v, (int, float, np.number)) else str(v))
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+
+class ForecastStateStore:
+    """Persisted per-product rolling windows for append-only daily refreshes."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.products: Dict[str, ProductState] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            self.products = {k: ProductState(**v) for k, v in raw.get("products", {}).items()}
+        self._loaded = True
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"products": {k: asdict(v) for k, v in self.products.items()}}, f)
+        tmp.replace(self.path)
+
+    def rebuild(self, processed_df: pd.DataFrame) -> int:
+        """Replace the state from a full preprocessed history (output of preprocess_data)."""
+        static_cols = [c for c in STATIC_COLUMNS if c in processed_df.columns]
+        products: Dict[str, ProductState] = {}
+        for pid, g in processed_df.groupby("product_id", sort=False):
+            g = g.sort_values("last_purchase_date")
+            last = g.iloc[-1]
+            last_day = g[g["last_purchase_date"] == last["last_purchase_date"]]
+            products[str(pid)] = ProductState(
+                product_id=pid.item() if isinstance(pid, np.generic) else pid,
+                last_date=last["last_purchase_date"].isoformat(),
+                window=[float(v) for v in g["sales"].tail(HISTORY_WINDOW)],
+                max_sales=float(g["sales"].max()),
+                static=_static_from_row(last, static_cols),
+                rows_seen=int(len(g)),
+                last_day_keys=[_row_key(r, static_cols) for r in last_day.to_dict(orient="records")],
+            )
+        with self._lock:
+            self.products = products
+            self._loaded = True
+            self._save()
+        return len(products)
+
+    def append(self, new_rows: pd.DataFrame) -> Dict[str, Any]:
+        """Fold new rows into the state; cost is O(new rows), independent of history.
+
+        Rows dated before a product's last known date cannot be inserted into
+        an append-only window and are counted as `stale` instead. Rows on the
+        last known date that were already folded in (same order_id, or the
+        same values without one) are counted as `duplicates`, so re-sending a
+        delta file is a no-op.
+        """
+        data = preprocess_data(new_rows)
+        static_cols = [c for c in STATIC_COLUMNS if c in data.columns]
+        updated, created, stale, duplicates = set(), set(), 0, 0
+        with self._lock:
+            self._ensure_loaded()
+            for row in data.to_dict(orient="records"):
+                pid = row["product_id"]
+                key = str(pid)
+                date = row["last_purchase_date"]
+                row_key = _row_key(row, static_cols)
+                state = self.products.get(key)
+                if state is None:
+                    state = ProductState(
+                        product_id=pid.item() if isinstance(pid, np.generic) else pid,
+                        last_date=date.isoformat(),
+                        window=[],
+                        max_sales=float(row["sales"]),
+                    )
+                    self.products[key] = state
+                    created.add(key)
+                elif date < pd.Timestamp(state.last_date):
+                    stale += 1
+                    continue
+                elif date.isoformat() == state.last_date and row_key in state.last_day_keys:
+                    duplicates += 1
+                    continue
+                state.append(date, row["sales"], _static_from_row(row, static_cols), row_key)
+                updated.add(key)
+            self._save()
+        return {"rows": int(len(data)), "stale": stale, "duplicates": duplicates, "updated": sorted(updated), "created": sorted(created)}
+
+    def forecast(self, forecast_days: int = 30, product_ids: Optional[List[str]] = None) -> pd.DataFrame:
+        with self._lock:
+            self._ensure_loaded()
+            keys = list(self.products.keys()) if product_ids is None else [k for k in product_ids if k in self.products]
+            # snapshot so concurrent appends don't mutate windows mid-forecast
+            snapshots = [(st.product_id, list(st.window), st.last_date, dict(st.static), st.max_sales)
+                         for st in (self.products[k] for k in keys)]
+        all_forecasts = []
+        for pid, window, last_date, static, max_sales in snapshots:
+            if not window:
+                continue
+            all_forecasts.extend(forecast_product(
+                pid, window, pd.Timestamp(last_date), static, max_sales, forecast_days,
+            ))
+        return pd.DataFrame(all_forecasts)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            self._ensure_loaded()
+            return {
+                "products": len(self.products),
+                "last_date": max((s.last_date for s in self.products.values()), default=None),
+                "rows_seen": sum(s.rows_seen for s in self.products.values()),
+            }
+
+
+FORECAST_STATE = ForecastStateStore(STORE.forecast_state_path)
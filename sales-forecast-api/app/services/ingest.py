@@ -0,0 +1,234 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import pandas as pd
+from ..config import settings
+from .common import STORE
+
+HASH_CHUNK = 1 << 20
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def entry_of(data_hash: str) -> str:
+    # data hashes are "<sha>" or "<sha>@<as-of date>"; artifacts live in the sha's entry
+    return data_hash.split("@", 1)[0]
+
+
+def _atomic_write(path: Path, write):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def _model_files() -> Dict[str, Path]:
+    return {
+        "preprocessor": STORE.churn_preprocessor_path,
+        "model": STORE.churn_model_path,
+        "features": STORE.churn_features_path,
+        "scorer": STORE.churn_scorer_path,
+    }
+
+
+def _dir_bytes(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+class ContentStore:
+    """Uploads and their derived artifacts, addressed by the SHA-256 of the bytes.
+
+    Everything derived from one content hash lives in one entry directory:
+      entries/<sha>/blob<suffix>        raw upload, written once per distinct content
+      entries/<sha>/<name>.pkl          parsed/typed/scored frames (pickle keeps dtypes)
+      entries/<sha>/<name>.json         metadata stored next to a frame
+      entries/<sha>/models/<key>/       churn artifacts trained on that data
+
+    Entries are evicted least recently used first once the cache holds more
+    than `max_entries` entries or `max_bytes` bytes; the entry just used is
+    always kept. Use is recorded as the entry directory's mtime, so the
+    order survives restarts.
+    """
+
+    def __init__(self, root: Path, max_entries: int = 32, max_bytes: int = 10 * 1024 ** 3):
+        self.root = root
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes))
+        self._lock = threading.RLock()
+        # (path, size, mtime_ns) -> sha, so reloading an unchanged file skips hashing
+        self._file_hashes: Dict[Tuple[str, int, int], str] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # --- entries ---
+
+    def _entry(self, sha: str) -> Path:
+        return self.root / "entries" / sha
+
+    def _touch(self, sha: str):
+        entry = self._entry(sha)
+        if entry.exists():
+            now = time.time()
+            os.utime(entry, (now, now))
+
+    def _entries(self) -> List[Path]:
+        base = self.root / "entries"
+        return [p for p in base.iterdir() if p.is_dir()] if base.exists() else []
+
+    def _evict(self, keep: str):
+        entries = sorted(self._entries(), key=lambda p: p.stat().st_mtime)
+        sizes = {p.name: _dir_bytes(p) for p in entries}
+        total = sum(sizes.values())
+        for entry in entries:
+            if len(entries) <= self.max_entries and total <= self.max_bytes:
+                break
+            if entry.name == keep:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            entries = [e for e in entries if e is not entry]
+            total -= sizes[entry.name]
+            self.evictions += 1
+            print(f"[ingest] Evicted cache entry {entry.name}")
+
+    def _written(self, sha: str):
+        self._touch(sha)
+        self._evict(keep=sha)
+
+    # --- raw bytes ---
+
+    def blob_path(self, sha: str, suffix: str = "") -> Path:
+        return self._entry(sha) / f"blob{suffix}"
+
+    def put_bytes(self, data: bytes, suffix: str = "") -> Tuple[str, Path, bool]:
+        """Store `data` once; returns (sha, blob path, already_stored)."""
+        sha = hash_bytes(data)
+        path = self.blob_path(sha, suffix)
+        with self._lock:
+            if path.exists():
+                self._touch(sha)
+                return sha, path, True
+            _atomic_write(path, lambda p: p.write_bytes(data))
+            self._written(sha)
+        return sha, path, False
+
+    def hash_file(self, path: str | Path) -> str:
+        p = Path(path)
+        st = p.stat()
+        key = (str(p.resolve()), st.st_size, st.st_mtime_ns)
+        sha = self._file_hashes.get(key)
+        if sha is None:
+            h = hashlib.sha256()
+            with open(p, "rb") as f:
+                for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                    h.update(chunk)
+            sha = h.hexdigest()
+            self._file_hashes[key] = sha
+        return sha
+
+    # --- derived frames ---
+
+    def _frame_path(self, sha: str, name: str, ext: str) -> Path:
+        return self._entry(sha) / f"{name}.{ext}"
+
+    def load_frame(self, sha: str, name: str) -> Optional[Tuple[pd.DataFrame, Dict[str, Any]]]:
+        path = self._frame_path(sha, name, "pkl")
+        with self._lock:
+            if not path.exists():
+                self.misses += 1
+                return None
+            self._touch(sha)
+        try:
+            df = pd.read_pickle(path)
+            meta_path = self._frame_path(sha, name, "json")
+            meta = json.loads(meta_path.read_text(encoding="utf-8")) if meta_path.exists() else {}
+        except Exception as e:
+            print(f"[ingest] Dropping unreadable cached frame {path}: {e}")
+            path.unlink(missing_ok=True)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return df, meta
+
+    def save_frame(self, sha: str, name: str, df: pd.DataFrame, meta: Optional[Dict[str, Any]] = None,
+                   replaces: Optional[str] = None):
+        """Cache a frame derived from content `sha`; `replaces` drops older frames with that name prefix."""
+        with self._lock:
+            if replaces is not None:
+                for old in self._entry(sha).glob(f"{replaces}*"):
+                    if old.is_file() and old.stem != name:
+                        old.unlink(missing_ok=True)
+            if meta is not None:
+                _atomic_write(self._frame_path(sha, name, "json"),
+                              lambda p: p.write_text(json.dumps(meta, default=str), encoding="utf-8"))
+            # frame last: its presence marks the entry as complete
+            _atomic_write(self._frame_path(sha, name, "pkl"), lambda p: df.to_pickle(p))
+            self._written(sha)
+
+    # --- trained models ---
+
+    def _model_dir(self, sha: str, key: str) -> Path:
+        return self._entry(sha) / "models" / hash_bytes(key.encode("utf-8"))
+
+    def save_models(self, sha: str, key: str, scores: Dict[str, Any]):
+        """Snapshot the current churn artifacts as the models trained on `key` (data from `sha`)."""
+        target = self._model_dir(sha, key)
+        with self._lock:
+            for src in _model_files().values():
+                dst = target / src.name
+                if src.exists():
+                    _atomic_write(dst, lambda p: shutil.copyfile(src, p))
+                else:
+                    dst.unlink(missing_ok=True)
+            # scores last: their presence marks the snapshot as complete
+            _atomic_write(target / "scores.json", lambda p: p.write_text(json.dumps(scores), encoding="utf-8"))
+            self._written(sha)
+
+    def restore_models(self, sha: str, key: str) -> Optional[Dict[str, Any]]:
+        """Install the churn artifacts trained on `key`; returns their scores or None."""
+        source = self._model_dir(sha, key)
+        scores_path = source / "scores.json"
+        files = _model_files()
+        required = [source / files[n].name for n in ("preprocessor", "model", "features")]
+        with self._lock:
+            if not scores_path.exists() or not all(p.exists() for p in required):
+                self.misses += 1
+                return None
+            for dst in files.values():
+                src = source / dst.name
+                if src.exists():
+                    # copyfile (not copy2) so the scorer cache sees a fresh mtime
+                    _atomic_write(dst, lambda p: shutil.copyfile(src, p))
+                else:
+                    # the scorer is optional: never leave one from another model
+                    dst.unlink(missing_ok=True)
+            scores = json.loads(scores_path.read_text(encoding="utf-8"))
+            self._touch(sha)
+        self.hits += 1
+        return scores
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._entries()
+            return {
+                "root": str(self.root),
+                "entries": len(entries),
+                "bytes": sum(_dir_bytes(p) for p in entries),
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+INGEST = ContentStore(Path(settings.ingest_dir), max_entries=settings.ingest_max_entries,
+                      max_bytes=settings.ingest_max_bytes)
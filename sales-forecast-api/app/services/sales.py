@@ -1,10 +1,20 @@
 from __future__ import annotations
 import pandas as pd
 import numpy as np
-from typing import Tuple, List, Dict
+import math
+from typing import Any, Tuple, List, Dict, Optional
 from statsmodels.tsa.holtwinters import ExponentialSmoothing
 from sklearn.linear_model import LinearRegression
-from .common import find_date_col, find_amount_col, find_product_col, STORE
+from .common import find_date_col, find_amount_col, find_product_col, to_datetime_series, STORE
+from .sampling import StratifiedSample, STRATUM_COL, z_value
+
+def _freq_for_span(span_days: int) -> str:
+    # monthly if > 9 months, else weekly/daily
+    if span_days >= 300:
+        return "M"
+    if span_days >= 90:
+        return "W"
+    return "D"
 
 def _coerce_ts(df: pd.DataFrame) -> Tuple[pd.Series, str]:
     date_col = find_date_col(df)
@@ -12,19 +22,11 @@ def _coerce_ts(df: pd.DataFrame) -> Tuple[pd.Series, str]:
     if date_col is None or amt_col is None:
         raise ValueError("Could not detect date/amount columns. Expect columns like 'date' and 'sales'/'amount'.")
     if not pd.api.types.is_datetime64_any_dtype(df[date_col]):
-        df[date_col] = pd.to_datetime(df[date_col], errors="coerce")
+        df[date_col] = to_datetime_series(df[date_col])
     ts = df.dropna(subset=[date_col, amt_col]).set_index(date_col)[amt_col].sort_index()
-    # choose frequency: monthly if > 9 months, else weekly/daily
     span_days = (ts.index.max() - ts.index.min()).days if len(ts) else 0
-    if span_days >= 300:
-        freq = "M"
-        series = ts.resample("M").sum()
-    elif span_days >= 90:
-        freq = "W"
-        series = ts.resample("W").sum()
-    else:
-        freq = "D"
-        series = ts.resample("D").sum()
+    freq = _freq_for_span(span_days)
+    series = ts.resample(freq).sum()
     return series, freq
 
 def forecast_total(df: pd.DataFrame, horizon: int) -> Tuple[List[str], List[float], str]:
@@ -52,12 +54,12 @@ def top_products(df: pd.DataFrame, n: int = 10) -> List[Dict]:
         return [{"product": "ALL", "predicted_next": last_val}]
 
     if not pd.api.types.is_datetime64_any_dtype(df[date_col]):
-        df[date_col] = pd.to_datetime(df[date_col], errors="coerce")
+        df[date_col] = to_datetime_series(df[date_col])
     # Build per-product trend using last 6 periods (resample to monthly if span big, else weekly)
     series, freq = _coerce_ts(df)
     resample_rule = {"M":"M","W":"W","D":"W"}.get(freq,"M")  # keep monthly or weekly
     items = []
-    for prod, g in df.dropna(subset=[prod_col]).groupby(prod_col):
+    for prod, g in df.dropna(subset=[prod_col]).groupby(prod_col, observed=True):
         s = g.set_index(date_col)[amt_col].sort_index().resample(resample_rule).sum()
         if len(s) < 3 or s.isna().all():
             pred = float(s.dropna().iloc[-1]) if len(s.dropna()) else 0.0
@@ -71,3 +73,87 @@ def top_products(df: pd.DataFrame, n: int = 10) -> List[Dict]:
         items.append({"product": str(prod), "predicted_next": max(0.0, pred)})
     items = sorted(items, key=lambda d: d["predicted_next"], reverse=True)[:n]
     return items
+
+# --- Approximate top products over a per-product stratified sample (see services.sampling) ---
+
+def sales_sample_strata(df: pd.DataFrame) -> Tuple[pd.Series, Dict[str, Any]]:
+    """Strata (one per product) and metadata for top-product samples.
+
+    The metadata holds what the estimator cannot recover from sampled rows:
+    the overall resampling frequency and each product's first/last date,
+    which fix the product's period grid.
+    """
+    date_col = find_date_col(df)
+    amt_col = find_amount_col(df)
+    prod_col = find_product_col(df)
+    if date_col is None or amt_col is None or prod_col is None:
+        raise ValueError("Top-product samples need date, amount and product columns.")
+    dates = df[date_col]
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = to_datetime_series(dates)
+    both = dates.notna() & df[amt_col].notna()
+    span_days = (dates[both].max() - dates[both].min()).days if both.any() else 0
+    ranges = dates.groupby(df[prod_col], observed=True).agg(["min", "max"]).dropna()
+    meta = {
+        "date_col": date_col,
+        "amt_col": amt_col,
+        "freq": _freq_for_span(span_days),
+        "ranges": {str(p): [r["min"].isoformat(), r["max"].isoformat()] for p, r in ranges.iterrows()},
+    }
+    return df[prod_col], meta
+
+def _next_value_weights(n_periods: int) -> np.ndarray:
+    # top_products' prediction as weights on the period sums: the last value for
+    # short series, else a linear trend over the last 6 periods evaluated one step ahead
+    w = np.zeros(n_periods)
+    if n_periods == 0:
+        return w
+    if n_periods < 3:
+        w[-1] = 1.0
+        return w
+    m = min(6, n_periods)
+    x = np.arange(m, dtype=np.float64)
+    xc = x - x.mean()
+    w[-m:] = 1.0 / m + (m - x.mean()) * xc / (xc ** 2).sum()
+    return w
+
+def top_products_approx(sample: StratifiedSample, n: int = 10, sample_size: Optional[int] = None,
+                        confidence: float = 0.95) -> Tuple[List[Dict], int]:
+    """top_products estimated from a per-product sample, with CI bounds per product.
+
+    The prediction is linear in the period sums, so it is estimated per
+    product as N/n times the sum of per-row contributions, with the usual
+    without-replacement variance. Returns (items, rows used).
+    """
+    meta = sample.meta
+    date_col, amt_col = meta["date_col"], meta["amt_col"]
+    resample_rule = {"M":"M","W":"W","D":"W"}.get(meta["freq"],"M")
+    rows = sample.take(sample_size)
+    dates = rows[date_col]
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = to_datetime_series(dates)
+    # resample bins hold whole days, so a time of day on a period's last day stays in that period
+    dates = dates.dt.normalize().to_numpy()
+    amounts = pd.to_numeric(rows[amt_col], errors="coerce").fillna(0.0).to_numpy(dtype=np.float64)
+    z = z_value(confidence)
+    items = []
+    for prod, idx in rows.groupby(STRATUM_COL, sort=False).indices.items():
+        bounds = meta["ranges"].get(prod)
+        if bounds is None:
+            # no dated rows: top_products predicts 0 for an empty series
+            items.append({"product": prod, "predicted_next": 0.0, "interval": [0.0, 0.0]})
+            continue
+        grid = pd.Series(0.0, index=pd.DatetimeIndex(pd.to_datetime(bounds))).resample(resample_rule).sum().index
+        weights = _next_value_weights(len(grid))
+        d = dates[idx]
+        valid = ~pd.isna(d)
+        contrib = np.zeros(len(idx))
+        # bins are closed on the right and labelled by their right edge
+        contrib[valid] = weights[grid.searchsorted(d[valid], side="left")] * amounts[idx][valid]
+        N, n_h = sample.populations[prod], len(idx)
+        est = N * float(contrib.mean())
+        var = N ** 2 * (1.0 - n_h / N) * float(contrib.var(ddof=1)) / n_h if n_h > 1 else 0.0
+        half = z * math.sqrt(max(var, 0.0))
+        items.append({"product": prod, "predicted_next": max(0.0, est), "interval": [max(0.0, est - half), max(0.0, est + half)]})
+    items = sorted(items, key=lambda d: d["predicted_next"], reverse=True)[:n]
+    return items, len(rows)
@@ -0,0 +1,138 @@
+from __future__ import annotations
+import math
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+STRATUM_COL = "_stratum"
+PRIORITY_COL = "_priority"
+WEIGHT_COL = "_weight"
+
+
+def _allocate(populations: Dict[str, int], n: int, min_per_stratum: int) -> Dict[str, int]:
+    """Split a budget of n rows over strata; the allocation never sums to more than n.
+
+    Each stratum first gets a floor so small strata still get an estimate,
+    scaled down to n // strata (but at least one row) when the budget cannot
+    cover min_per_stratum everywhere. The rest is shared in proportion to
+    the rows each stratum has left, rounding by largest remainder. A stratum
+    without rows would silently drop out of every estimate, so a budget
+    smaller than the number of strata raises ValueError.
+    """
+    labels = [h for h, N in populations.items() if N > 0]
+    N = np.array([populations[h] for h in labels], dtype=np.int64)
+    total = int(N.sum())
+    if total == 0:
+        return {}
+    if total <= n:
+        return dict(zip(labels, N.tolist()))
+    if n < len(labels):
+        raise ValueError(f"A sample of {n} rows cannot cover {len(labels)} strata; "
+                         f"use at least {len(labels)} rows or mode=exact.")
+    base = np.minimum(N, max(1, min(min_per_stratum, n // len(labels))))
+    spare = N - base
+    # total > n, so the remaining budget is less than the spare rows and no share exceeds its stratum
+    share = (n - int(base.sum())) * spare / float(spare.sum())
+    alloc = base + np.floor(share).astype(np.int64)
+    short = n - int(alloc.sum())
+    if short > 0:
+        alloc[np.argsort(-(share - np.floor(share)), kind="stable")[:short]] += 1
+    return dict(zip(labels, alloc.tolist()))
+
+
+@dataclass
+class StratifiedSample:
+    """Per-stratum reservoir sample of a frame.
+
+    Every row gets a uniform random priority and each stratum keeps the rows
+    with the smallest priorities. The first m kept rows of a stratum are
+    therefore a simple random sample of it for any m, so one stored sample
+    serves every smaller `sample_size` without being rebuilt.
+    """
+    rows: pd.DataFrame  # sampled rows + STRATUM_COL/PRIORITY_COL, sorted by (stratum, priority)
+    populations: Dict[str, int]  # rows per stratum in the full frame
+    min_per_stratum: int
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def population_rows(self) -> int:
+        return int(sum(self.populations.values()))
+
+    def take(self, sample_size: Optional[int] = None) -> pd.DataFrame:
+        """Sampled rows for a budget of `sample_size` rows, with per-row WEIGHT_COL = N_h / n_h."""
+        kept = self.rows[STRATUM_COL].value_counts().to_dict()
+        if sample_size is None:
+            alloc = kept
+        else:
+            alloc = _allocate(self.populations, sample_size, self.min_per_stratum)
+            alloc = {h: min(n, kept.get(h, 0)) for h, n in alloc.items()}
+        rank = self.rows.groupby(STRATUM_COL, sort=False).cumcount().to_numpy()
+        limit = self.rows[STRATUM_COL].map(alloc).to_numpy()
+        out = self.rows.loc[rank < limit].copy()
+        n_h = out[STRATUM_COL].map(out[STRATUM_COL].value_counts())
+        out[WEIGHT_COL] = out[STRATUM_COL].map(self.populations) / n_h
+        return out
+
+
+def build_sample(df: pd.DataFrame, strata: pd.Series, sample_rows: int, min_per_stratum: int = 30,
+                 seed: int = 0, meta: Optional[Dict[str, Any]] = None) -> StratifiedSample:
+    """Stratified reservoir sample of at most `sample_rows` rows of `df`; rows whose stratum is missing are left out."""
+    codes, labels = pd.factorize(strata, sort=True)
+    labels = [str(v) for v in labels]
+    priority = np.random.default_rng(seed).random(len(df))
+    valid = np.flatnonzero(codes >= 0)
+    order = valid[np.lexsort((priority[valid], codes[valid]))]
+    sorted_codes = codes[order]
+    counts = np.bincount(sorted_codes, minlength=len(labels))
+    populations = {labels[i]: int(c) for i, c in enumerate(counts) if c}
+    alloc = _allocate(populations, sample_rows, min_per_stratum)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    rank = np.arange(len(order)) - starts[sorted_codes]
+    limit = np.array([alloc.get(labels[i], 0) for i in range(len(labels))], dtype=np.int64)
+    keep = order[rank < limit[sorted_codes]]
+    rows = df.iloc[keep].copy()
+    rows[STRATUM_COL] = [labels[c] for c in codes[keep]]
+    rows[PRIORITY_COL] = priority[keep]
+    return StratifiedSample(rows=rows.reset_index(drop=True), populations=populations,
+                            min_per_stratum=min_per_stratum, meta=meta or {})
+
+
+def z_value(confidence: float) -> float:
+    return float(norm.ppf(0.5 + confidence / 2.0))
+
+
+def stratified_total(z: np.ndarray, strata: pd.Series, populations: Dict[str, int],
+                     confidence: float = 0.95) -> Tuple[float, float]:
+    """Estimate sum(z) over the full frame from sampled values; returns (estimate, CI half-width).
+
+    Within each stratum the sample is a simple random sample without
+    replacement, so Var = sum_h N_h^2 (1 - n_h/N_h) s_h^2 / n_h.
+    """
+    g = pd.DataFrame({"h": strata.to_numpy(), "z": np.asarray(z, dtype=np.float64)}).groupby("h", sort=False)["z"]
+    stats = g.agg(["mean", "var", "count"])
+    N = stats.index.map(populations).to_numpy(dtype=np.float64)
+    n = stats["count"].to_numpy(dtype=np.float64)
+    total = float((N * stats["mean"].to_numpy()).sum())
+    var = float((N ** 2 * (1.0 - n / N) * stats["var"].fillna(0.0).to_numpy() / n).sum())
+    return total, z_value(confidence) * math.sqrt(max(var, 0.0))
+
+
+def proportion_interval(p: float, n: int, N: int, confidence: float = 0.95) -> Tuple[float, float]:
+    """Normal CI for a proportion estimated from n of N rows (finite population corrected)."""
+    if n <= 1 or n >= N:
+        return p, p
+    half = z_value(confidence) * math.sqrt((1.0 - n / N) * p * (1.0 - p) / (n - 1))
+    return max(0.0, p - half), min(1.0, p + half)
+
+
+def to_frame(sample: StratifiedSample) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """Split a sample into a frame and JSON metadata for the ingest cache."""
+    return sample.rows, {"populations": sample.populations, "min_per_stratum": sample.min_per_stratum,
+                         "meta": sample.meta}
+
+
+def from_frame(rows: pd.DataFrame, info: Dict[str, Any]) -> StratifiedSample:
+    return StratifiedSample(rows=rows, populations={k: int(v) for k, v in info["populations"].items()},
+                            min_per_stratum=int(info["min_per_stratum"]), meta=info.get("meta", {}))
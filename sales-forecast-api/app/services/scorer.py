@@ -0,0 +1,250 @@
+from __future__ import annotations
+import math
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+import numpy as np
+import pandas as pd
+from joblib import dump, load
+from scipy.special import expit
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from .common import STORE
+
+PARITY_TOLERANCE = 1e-9
+
+
+def _is_missing(v: Any) -> bool:
+    return v is None or v is pd.NaT or v is pd.NA or (isinstance(v, float) and math.isnan(v))
+
+
+@dataclass
+class CompiledScorer:
+    """Flat NumPy churn scorer compiled from a fitted preprocessor + classifier.
+
+    Numeric columns: impute with the fitted median, then (x - mean) / scale.
+    Categorical columns: impute with the fitted mode, then one-hot through a
+    value -> position vocabulary (unknown values encode as all zeros).
+    The model is either a linear logit (logreg) or flattened tree arrays
+    (rf: mean leaf probability, gb: init + learning_rate * leaf sum).
+    """
+    kind: str
+    num_cols: List[str]
+    num_fill: np.ndarray
+    num_mean: np.ndarray
+    num_scale: np.ndarray
+    cat_cols: List[str]
+    cat_fill: List[Any]
+    cat_vocab: List[Dict[Any, int]]
+    n_features: int
+    # logreg
+    coef: Optional[np.ndarray] = None
+    intercept: float = 0.0
+    # trees (all trees concatenated; leaves point at themselves)
+    roots: Optional[np.ndarray] = None
+    left: Optional[np.ndarray] = None
+    right: Optional[np.ndarray] = None
+    feature: Optional[np.ndarray] = None
+    threshold: Optional[np.ndarray] = None
+    leaf_value: Optional[np.ndarray] = None
+    max_depth: int = 0
+    parity_max_abs_diff: Optional[float] = None
+
+    def transform(self, records: Sequence[Mapping[str, Any]]) -> np.ndarray:
+        X = np.zeros((len(records), self.n_features), dtype=np.float64)
+        n_num = len(self.num_cols)
+        for r, rec in enumerate(records):
+            for j, col in enumerate(self.num_cols):
+                v = rec.get(col)
+                if _is_missing(v):
+                    v = self.num_fill[j]
+                X[r, j] = float(v)
+            offset = n_num
+            for j, col in enumerate(self.cat_cols):
+                v = rec.get(col)
+                if _is_missing(v):
+                    v = self.cat_fill[j]
+                pos = self.cat_vocab[j].get(v)
+                if pos is not None:
+                    X[r, offset + pos] = 1.0
+                offset += len(self.cat_vocab[j])
+        if n_num:
+            X[:, :n_num] = (X[:, :n_num] - self.num_mean) / self.num_scale
+        return X
+
+    def _tree_leaves(self, X: np.ndarray) -> np.ndarray:
+        # sklearn trees compare float32-cast inputs against float64 thresholds
+        Xf = X.astype(np.float32).astype(np.float64)
+        rows = np.arange(Xf.shape[0])[:, None]
+        nodes = np.broadcast_to(self.roots, (Xf.shape[0], self.roots.shape[0])).copy()
+        for _ in range(self.max_depth):
+            go_left = Xf[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return self.leaf_value[nodes]
+
+    def predict_proba(self, records: Sequence[Mapping[str, Any]]) -> np.ndarray:
+        X = self.transform(records)
+        if self.kind == "logreg":
+            return expit(X @ self.coef + self.intercept)
+        leaves = self._tree_leaves(X)
+        if self.kind == "rf":
+            return leaves.sum(axis=1) / leaves.shape[1]
+        return expit(self.intercept + leaves.sum(axis=1))
+
+
+def _compile_preprocessor(pre: ColumnTransformer) -> Dict[str, Any]:
+    num_cols, num_fill, num_mean, num_scale = [], [], [], []
+    cat_cols, cat_fill, cat_vocab = [], [], []
+    for name, trans, cols in pre.transformers_:
+        if trans == "drop" or len(cols) == 0:
+            continue
+        steps = [s for _, s in trans.steps] if isinstance(trans, Pipeline) else [trans]
+        imputer = next((s for s in steps if isinstance(s, SimpleImputer)), None)
+        scaler = next((s for s in steps if isinstance(s, StandardScaler)), None)
+        onehot = next((s for s in steps if isinstance(s, OneHotEncoder)), None)
+        if len(steps) != sum(s is not None for s in (imputer, scaler, onehot)):
+            raise ValueError(f"Unsupported step in transformer '{name}'.")
+        cols = list(cols)
+        stats = imputer.statistics_ if imputer is not None else np.full(len(cols), np.nan, dtype=object)
+        # SimpleImputer drops columns that were entirely missing at fit time
+        kept = [i for i in range(len(cols)) if not pd.isna(stats[i])] if imputer is not None else list(range(len(cols)))
+        if onehot is None:
+            mean = scaler.mean_ if scaler is not None and scaler.with_mean else np.zeros(len(kept))
+            scale = scaler.scale_ if scaler is not None and scaler.with_std else np.ones(len(kept))
+            for k, i in enumerate(kept):
+                num_cols.append(cols[i])
+                num_fill.append(float(stats[i]))
+                num_mean.append(float(mean[k]))
+                num_scale.append(float(scale[k]))
+        else:
+            if scaler is not None or onehot.drop is not None or onehot.handle_unknown != "ignore":
+                raise ValueError(f"Unsupported one-hot configuration in transformer '{name}'.")
+            for k, i in enumerate(kept):
+                cat_cols.append(cols[i])
+                cat_fill.append(stats[i])
+                cat_vocab.append({v: p for p, v in enumerate(onehot.categories_[k].tolist())})
+    n_features = len(num_cols) + sum(len(v) for v in cat_vocab)
+    return {
+        "num_cols": num_cols,
+        "num_fill": np.asarray(num_fill, dtype=np.float64),
+        "num_mean": np.asarray(num_mean, dtype=np.float64),
+        "num_scale": np.asarray(num_scale, dtype=np.float64),
+        "cat_cols": cat_cols,
+        "cat_fill": cat_fill,
+        "cat_vocab": cat_vocab,
+        "n_features": n_features,
+    }
+
+
+def _flatten_trees(trees, leaf_values: List[np.ndarray]) -> Dict[str, Any]:
+    roots, left, right, feature, threshold, values = [], [], [], [], [], []
+    offset, max_depth = 0, 0
+    for tree, vals in zip(trees, leaf_values):
+        n = tree.node_count
+        ids = np.arange(n) + offset
+        is_leaf = tree.children_left == -1
+        left.append(np.where(is_leaf, ids, tree.children_left + offset))
+        right.append(np.where(is_leaf, ids, tree.children_right + offset))
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(np.where(is_leaf, 0.0, tree.threshold))
+        values.append(vals)
+        roots.append(offset)
+        offset += n
+        max_depth = max(max_depth, int(tree.max_depth))
+    return {
+        "roots": np.asarray(roots, dtype=np.int64),
+        "left": np.concatenate(left).astype(np.int64),
+        "right": np.concatenate(right).astype(np.int64),
+        "feature": np.concatenate(feature).astype(np.int64),
+        "threshold": np.concatenate(threshold).astype(np.float64),
+        "leaf_value": np.concatenate(values).astype(np.float64),
+        "max_depth": max_depth,
+    }
+
+
+def compile_scorer(pre: ColumnTransformer, model, X_sample: Optional[pd.DataFrame] = None) -> CompiledScorer:
+    """Compile a fitted preprocessor + binary classifier into a CompiledScorer.
+
+    With `X_sample`, sklearn and compiled probabilities are compared and a
+    ValueError is raised if they differ by more than PARITY_TOLERANCE.
+    """
+    if len(getattr(model, "classes_", [])) != 2:
+        raise ValueError("Compiled scorer supports binary churn models only.")
+    parts = _compile_preprocessor(pre)
+    pos = 1  # predict_proba(...)[:, 1] is the churn probability
+
+    if isinstance(model, LogisticRegression):
+        scorer = CompiledScorer(kind="logreg", coef=model.coef_[0].astype(np.float64),
+                                intercept=float(model.intercept_[0]), **parts)
+    elif isinstance(model, RandomForestClassifier):
+        trees, vals = [], []
+        for est in model.estimators_:
+            t = est.tree_
+            v = t.value[:, 0, :].astype(np.float64)
+            norm = v.sum(axis=1)
+            norm[norm == 0.0] = 1.0
+            trees.append(t)
+            vals.append(v[:, pos] / norm)
+        scorer = CompiledScorer(kind="rf", **parts, **_flatten_trees(trees, vals))
+    elif isinstance(model, GradientBoostingClassifier):
+        trees = [est.tree_ for est in model.estimators_[:, 0]]
+        vals = [t.value[:, 0, 0].astype(np.float64) * model.learning_rate for t in trees]
+        scorer = CompiledScorer(kind="gb", **parts, **_flatten_trees(trees, vals))
+        # the init estimator's raw prediction is constant; recover it from one row
+        x0 = np.zeros((1, scorer.n_features))
+        raw = float(model.decision_function(x0)[0])
+        scorer.intercept = raw - float(scorer._tree_leaves(x0).sum())
+    else:
+        raise ValueError(f"No compiled scorer for model type {type(model).__name__}.")
+
+    if X_sample is not None and len(X_sample):
+        expected = Pipeline([("pre", pre), ("clf", model)]).predict_proba(X_sample)[:, pos]
+        got = scorer.predict_proba(X_sample.to_dict(orient="records"))
+        diff = float(np.max(np.abs(expected - got)))
+        if diff > PARITY_TOLERANCE:
+            raise ValueError(f"Compiled scorer disagrees with sklearn (max abs diff {diff:.3g}).")
+        scorer.parity_max_abs_diff = diff
+    return scorer
+
+
+@dataclass
+class _ScorerCache:
+    scorer: Optional[CompiledScorer] = None
+    mtime: Optional[float] = None
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+_CACHE = _ScorerCache()
+
+
+def export_scorer(pre, model, X_sample: Optional[pd.DataFrame] = None) -> Optional[CompiledScorer]:
+    """Compile, verify and persist the scorer; on failure remove any stale one."""
+    path = STORE.churn_scorer_path
+    try:
+        scorer = compile_scorer(pre, model, X_sample)
+    except ValueError as e:
+        print(f"[scorer] Compiled scorer not exported: {e}")
+        if path.exists():
+            path.unlink()
+        return None
+    dump(scorer, path)
+    return scorer
+
+
+def get_scorer() -> Optional[CompiledScorer]:
+    """Current compiled scorer, reloaded only when the persisted file changes."""
+    path = STORE.churn_scorer_path
+    if not path.exists():
+        return None
+    mtime = path.stat().st_mtime
+    if _CACHE.scorer is not None and _CACHE.mtime == mtime:
+        return _CACHE.scorer
+    with _CACHE.lock:
+        if _CACHE.mtime != mtime:
+            _CACHE.scorer = load(path)
+            _CACHE.mtime = mtime
+        return _CACHE.scorer